@@ -0,0 +1,323 @@
+# =============================================================================
+# Rectifex - Strategy Backtest
+# Replays the factor model over past rebalance dates. Price histories and the
+# annual statements come from the provider (normally the local cache), scan
+# snapshots add the fundamentals Rectifex actually saw on each day. Everything
+# is laid out as one rebalance dates x metrics x tickers cube and ranked,
+# scored and evaluated for all dates and strategies at once, with the same
+# winsorize / percentile-rank / weight-matrix functions as a live scan.
+#
+#   python3 backtest.py                                  # global_top, 10 years, monthly, top 20
+#   python3 backtest.py --provider cache --top 50 --frequency quarterly
+#   python3 backtest.py --provider synthetic --synthetic-size 3000 --json bt.json
+#
+# Fundamentals become visible PUBLICATION_LAG_DAYS after the fiscal year end.
+# Per-share values use today's share count and the universe is today's
+# (survivorship bias); Yahoo keeps four annual statements, so growth and ROE
+# thin out towards the start of long backtests (see 'coverage' in the report).
+# =============================================================================
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+import screener_engine
+from screener_engine import APPROX_RATES, MAX_WORKERS, TICKER_DEADLINE, safe_float, statement_rows, statement_metrics
+from scoring_engine import METRICS_TO_RANK, STRATEGY_DEFINITIONS, BASE_SCORES, STYLE_COLUMNS, weight_matrix, winsorize, percentile_ranks, score_matrix
+from data_providers import SyntheticProvider, ReplayProvider, OfflineProvider, YFinanceProvider
+from cache_store import CachedProvider
+from fetch_scheduler import FetchScheduler, FetchError, RateLimitedProvider
+from instrumentation import ScanMetrics, InstrumentedProvider, instrument, write_report
+from snapshot_store import SnapshotStore
+
+FREQUENCIES = {'monthly': ('M', 12), 'quarterly': ('Q', 4)}
+MOMENTUM_LOOKBACK = 126
+PUBLICATION_LAG_DAYS = 90
+STATEMENT_MAX_AGE_DAYS = 456
+SNAPSHOT_MAX_AGE_DAYS = 45
+MAX_STALE_DAYS = 5
+PRICE_BLOCK = 1024
+DEFAULT_YEARS = 10
+DEFAULT_TOP_N = 20
+STATEMENT_COLUMNS = ['RevGrowth3YCAGR', 'ROE_Avg3Y', 'DebtEquity', 'EPS', 'BookPerShare']
+SNAPSHOT_COLUMNS = [*STATEMENT_COLUMNS, 'DivYield']
+BENCHMARK = 'Universe'
+
+# --- Data ---
+def history_period(years):
+    # One extra year for the momentum / volatility window of the first rebalance.
+    return f'{years + 1}y'
+
+def rebalance_rows(dates, start, frequency='monthly'):
+    # Last trading day of every month (quarter) from start on; the final row is the latest close.
+    periods = dates.to_period(FREQUENCIES[frequency][0]).asi8
+    rows = np.flatnonzero(np.r_[periods[1:] != periods[:-1], True])
+    return rows[dates[rows] >= start]
+
+def statement_events(ticker, provider, lag_days=PUBLICATION_LAG_DAYS):
+    # One row per annual statement with the ratios calculate_metrics derives from it, available lag_days after the fiscal
+    # year end. EPS and book value per share are in the trading currency, at today's share count.
+    info = provider.info(ticker)
+    if not info: raise FetchError('no_data', f"{ticker}: keine Stammdaten")
+    if info.get('quoteType') != 'EQUITY': raise FetchError('not_equity', f"{ticker}: keine Aktie")
+    price = safe_float(info.get('regularMarketPrice', info.get('currentPrice'))); market_cap = safe_float(info.get('marketCap'))
+    shares = market_cap / price if price > 0 else np.nan
+    currency = info.get('currency', 'USD'); financial_currency = info.get('financialCurrency', currency)
+    fx = APPROX_RATES.get(financial_currency, 1.0) / APPROX_RATES.get(currency, 1.0)
+    financials = provider.financials(ticker); rows = statement_rows(financials, provider.balance_sheet(ticker)); events = []
+    if not rows: return events
+    income = rows.get('Net Income', []); equity = rows.get('Stockholders Equity', [])
+    for offset, period_end in enumerate(financials.columns):
+        row = {'Ticker': ticker, 'AvailableAt': pd.Timestamp(period_end) + pd.Timedelta(days=lag_days), **statement_metrics(rows, offset)}
+        if offset < len(income): row['EPS'] = income[offset] * fx / shares
+        if offset < len(equity): row['BookPerShare'] = equity[offset] * fx / shares
+        events.append(row)
+    return events
+
+def load_statements(tickers, provider, metrics, lag_days=PUBLICATION_LAG_DAYS):
+    scheduler = FetchScheduler(max_workers=MAX_WORKERS * 2, initial_workers=MAX_WORKERS, deadline=TICKER_DEADLINE); events = []
+    for outcome in scheduler.run(tickers, metrics.wrap_task(lambda ticker: statement_events(ticker, provider, lag_days))):
+        if outcome.ok: events.extend(outcome.result)
+        elif outcome.reason not in ('no_data', 'not_equity'): logging.warning(f"Ticker {outcome.symbol} hat einen Fehler verursacht ({outcome.reason}): {outcome.error}")
+    metrics.record_scheduler(scheduler); metrics.failures.update(scheduler.failures)
+    return pd.DataFrame(events, columns=['Ticker', 'AvailableAt', *STATEMENT_COLUMNS])
+
+# --- Cube ---
+def price_factors(closes, rows):
+    # Momentum6M and Volatility as compute_price_factors returns them on each rebalance day (trailing one-year window,
+    # momentum over the ticker's own last MOMENTUM_LOOKBACK closes), plus the close used for entry and valuation.
+    # Processed in blocks of tickers, so a decade of daily closes for thousands of tickers stays within a few arrays.
+    dates = closes.index; n_rows = len(rows); n_tickers = closes.shape[1]
+    window_start = np.searchsorted(dates, dates[rows] - pd.DateOffset(years=1), side='right')
+    momentum, volatility, price = (np.full((n_rows, n_tickers), np.nan) for _ in range(3))
+    for block in range(0, n_tickers, PRICE_BLOCK):
+        values = closes.iloc[:, block:block + PRICE_BLOCK].to_numpy(dtype=float); cols = slice(block, block + values.shape[1]); valid = ~np.isnan(values)
+        counts = np.vstack([np.zeros((1, values.shape[1]), dtype=int), np.cumsum(valid, axis=0)])
+        order = np.argsort(~valid, axis=0, kind='stable'); compressed = np.take_along_axis(values, order, axis=0)
+        taken = counts[rows + 1]; before = counts[window_start]; in_window = taken - before
+        last_close = np.take_along_axis(compressed, np.maximum(taken - 1, 0), axis=0)
+        lookback_close = np.take_along_axis(compressed, np.maximum(taken - MOMENTUM_LOOKBACK, 0), axis=0)
+        has_history = in_window > MOMENTUM_LOOKBACK
+        # A close older than MAX_STALE_DAYS trading days means the ticker did not trade (yet or any more) on that date.
+        last_row = np.maximum.accumulate(np.where(valid, np.arange(len(dates))[:, None], -1), axis=0)[rows]
+        price[:, cols] = np.where((last_row >= 0) & (rows[:, None] - last_row <= MAX_STALE_DAYS), last_close, np.nan)
+        previous = pd.DataFrame(values).ffill().shift(1).to_numpy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns = np.where(valid, values / previous - 1, np.nan)
+            momentum[:, cols] = np.where(has_history, (last_close / lookback_close - 1) * 100, np.nan)
+        finite = ~np.isnan(returns); x = np.where(finite, returns, 0.0); zero = np.zeros((1, values.shape[1]))
+        sums = [np.vstack([zero, np.cumsum(part, axis=0)]) for part in (finite.astype(float), x, x * x)]
+        n, s1, s2 = (cumulative[rows + 1] - cumulative[window_start] for cumulative in sums)
+        # The window's first close has no predecessor inside the one-year download, so its return does not count.
+        first = np.take_along_axis(returns, np.take_along_axis(order, np.minimum(before, len(dates) - 1), axis=0), axis=0)
+        boundary = (before > 0) & (in_window > 0) & ~np.isnan(first); first = np.where(boundary, first, 0.0)
+        n = n - boundary; s1 = s1 - first; s2 = s2 - first * first
+        with np.errstate(divide='ignore', invalid='ignore'): variance = np.maximum(s2 - s1 * s1 / n, 0) / (n - 1)
+        volatility[:, cols] = np.where(has_history, np.sqrt(variance) * np.sqrt(252) * 100, np.nan)
+    return momentum, volatility, price
+
+def point_in_time(events, dates, tickers, columns, max_age_days):
+    # {column: dates x tickers} holding, on each date, the latest event available by then; NaN before the first one
+    # and once the latest is older than max_age_days.
+    result = {col: np.full((len(dates), len(tickers)), np.nan) for col in columns}
+    if events.empty: return result
+    events = events.sort_values('AvailableAt', kind='stable'); cols = pd.Index(tickers).get_indexer(events['Ticker']); keep = cols >= 0
+    available = events['AvailableAt'].to_numpy(dtype='datetime64[ns]')[keep]; cols = cols[keep]; when = dates.to_numpy(dtype='datetime64[ns]')
+    rows = np.searchsorted(when, available, side='left'); inside = rows < len(dates)
+    latest = np.full((len(dates), len(tickers)), -1); np.maximum.at(latest, (rows[inside], cols[inside]), np.flatnonzero(inside))
+    latest = np.maximum.accumulate(latest, axis=0); found = np.maximum(latest, 0)
+    fresh = (latest >= 0) & (when[:, None] - available[found] <= np.timedelta64(max_age_days, 'D'))
+    for col in columns:
+        if col in events.columns: result[col] = np.where(fresh, events[col].to_numpy(dtype=float)[keep][found], np.nan)
+    return result
+
+def snapshot_fundamentals(store, dates, tickers, max_age_days=SNAPSHOT_MAX_AGE_DAYS):
+    # Latest scan snapshot on or before each date: what Rectifex saw then, no publication lag needed.
+    snapshots = store.snapshots(end=dates[-1]); result = {}
+    if not snapshots: return result
+    taken = pd.DatetimeIndex([snapshot.taken_at for snapshot in snapshots])
+    picks = np.searchsorted(taken, dates, side='right') - 1
+    fresh = (picks >= 0) & (dates - taken[np.maximum(picks, 0)] <= pd.Timedelta(days=max_age_days))
+    columns = pd.Index(tickers); frames = {}
+    for row, pick in enumerate(picks):
+        if not fresh[row]: continue
+        if pick not in frames: frames[pick] = store.load(snapshots[pick]).drop_duplicates('Ticker').set_index('Ticker')
+        frame = frames[pick]
+        for col in SNAPSHOT_COLUMNS:
+            if col in frame.columns: result.setdefault(col, np.full((len(dates), len(tickers)), np.nan))[row] = frame[col].reindex(columns).to_numpy(dtype=float)
+    return result
+
+def build_cube(closes, statements, rows, snapshots=None):
+    # metrics x dates x tickers in METRICS_TO_RANK order, NaN outside the tradable universe of each date, plus the
+    # entry prices (dates x tickers).
+    dates = closes.index[rows]; tickers = closes.columns
+    momentum, volatility, price = price_factors(closes, rows)
+    fundamentals = point_in_time(statements, dates, tickers, STATEMENT_COLUMNS, STATEMENT_MAX_AGE_DAYS)
+    for col, values in (snapshots or {}).items():
+        fundamentals[col] = np.where(np.isnan(values), fundamentals.get(col, np.nan), values)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # As with Yahoo's ratios, a loss or negative book value leaves P/E resp. P/B undefined instead of negative.
+        pe = np.where(fundamentals['EPS'] > 0, price / fundamentals['EPS'], np.nan)
+        pb = np.where(fundamentals['BookPerShare'] > 0, price / fundamentals['BookPerShare'], np.nan)
+    values = {'ROE_Avg3Y': fundamentals['ROE_Avg3Y'], 'PE': pe, 'PB': pb, 'RevGrowth3YCAGR': fundamentals['RevGrowth3YCAGR'], 'Momentum6M': momentum,
+              'DivYield': fundamentals.get('DivYield', np.full(price.shape, np.nan)), 'Volatility': volatility, 'DebtEquity': fundamentals['DebtEquity']}
+    tradable = ~np.isnan(price)
+    return np.stack([np.where(tradable, values[metric], np.nan) for metric in METRICS_TO_RANK]), price
+
+def score_cube(cube, strategies):
+    # Per date: winsorize and percentile-rank every metric across the tradable tickers, then the usual weight matrices.
+    ranks = np.stack([percentile_ranks(winsorize(cube[i]), ascending) for i, ascending in enumerate(METRICS_TO_RANK.values())], axis=-1)
+    return score_matrix(ranks, strategies)[1]
+
+# --- Evaluation ---
+def evaluate(scores, price, top_n):
+    # scores: dates x tickers x strategies. Equal-weight top-N portfolios held from one rebalance to the next; the last
+    # rebalance only yields the current picks.
+    tradable = ~np.isnan(price)
+    # A holding that stops trading before the next rebalance is valued at its last close.
+    exit_price = pd.DataFrame(price).ffill().to_numpy()[1:]
+    with np.errstate(divide='ignore', invalid='ignore'): forward = np.where(tradable[:-1], exit_price / price[:-1] - 1, np.nan)
+    ranked = np.where(tradable[..., None], scores, -np.inf).transpose(2, 0, 1); top_n = min(top_n, ranked.shape[-1])
+    picks = np.argpartition(-ranked, top_n - 1, axis=-1)[..., :top_n]; held = np.isfinite(np.take_along_axis(ranked, picks, axis=-1))
+    members = np.zeros(ranked.shape, dtype=bool); np.put_along_axis(members, picks, held, axis=-1)
+    pick_returns = np.where(held[:, :-1], np.take_along_axis(np.broadcast_to(forward, ranked[:, :-1].shape), picks[:, :-1], axis=-1), np.nan)
+    with np.errstate(invalid='ignore'):
+        portfolio = np.nanmean(pick_returns, axis=-1); benchmark = np.nanmean(forward, axis=-1)
+        beats_median = np.nanmean(np.where(np.isnan(pick_returns), np.nan, pick_returns > np.nanmedian(forward, axis=-1)[None, :, None]), axis=(1, 2))
+        # One-way turnover: share of the portfolio replaced at each rebalance.
+        turnover = 1 - (members[:, 1:] & members[:, :-1]).sum(axis=-1) / np.maximum(held[:, 1:].sum(axis=-1), 1)
+    return portfolio, benchmark, turnover, beats_median, information_coefficient(scores[:-1], forward), picks[:, -1], held[:, -1]
+
+def information_coefficient(scores, forward):
+    # Spearman correlation of each strategy score with the next period's return, per date (dates x strategies).
+    valid = ~np.isnan(forward)[..., None] & np.isfinite(scores)
+    score_ranks = percentile_ranks(np.where(valid, scores, np.nan).transpose(0, 2, 1))
+    return_ranks = percentile_ranks(np.where(valid, forward[..., None], np.nan).transpose(0, 2, 1))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        a = score_ranks - np.nanmean(score_ranks, axis=-1, keepdims=True); b = return_ranks - np.nanmean(return_ranks, axis=-1, keepdims=True)
+        return np.nansum(a * b, axis=-1) / np.sqrt(np.nansum(a * a, axis=-1) * np.nansum(b * b, axis=-1))
+
+def performance(returns, periods_per_year):
+    returns = returns[~np.isnan(returns)]
+    if not len(returns): return {'TotalReturn': np.nan, 'CAGR': np.nan, 'Volatility': np.nan, 'Sharpe': np.nan, 'MaxDrawdown': np.nan}
+    wealth = np.cumprod(1 + returns); drawdown = wealth / np.maximum.accumulate(np.r_[1.0, wealth])[1:] - 1
+    volatility = returns.std(ddof=1) * np.sqrt(periods_per_year) if len(returns) > 1 else np.nan
+    return {'TotalReturn': (wealth[-1] - 1) * 100, 'CAGR': (wealth[-1] ** (periods_per_year / len(returns)) - 1) * 100, 'Volatility': volatility * 100,
+            'Sharpe': returns.mean() * periods_per_year / volatility if volatility else np.nan, 'MaxDrawdown': min(drawdown.min(), 0) * 100}
+
+def uncovered_inputs(coverage, strategies):
+    # {strategy: {'metrics': [...], 'weight': share}} for strategies that put weight on metrics without any data
+    # (e.g. DivYield without snapshot history); those metrics rank as neutral on every date.
+    metric_weights = weight_matrix(BASE_SCORES, list(METRICS_TO_RANK)) @ weight_matrix(strategies, STYLE_COLUMNS); result = {}
+    for j, name in enumerate(strategies):
+        missing = [metric for i, metric in enumerate(METRICS_TO_RANK) if metric_weights[i, j] > 0 and coverage[metric] == 0]
+        weight = sum(metric_weights[i, j] for i, metric in enumerate(METRICS_TO_RANK) if metric in missing) / metric_weights[:, j].sum()
+        if missing: result[name] = {'metrics': missing, 'weight': round(float(weight), 4)}
+    return result
+
+# --- Backtest ---
+def run_backtest(provider=None, tickers=None, years=DEFAULT_YEARS, top_n=DEFAULT_TOP_N, frequency='monthly', strategies=None,
+                 lag_days=PUBLICATION_LAG_DAYS, store=None, metrics=None):
+    # Returns (summary, returns, report): one row per strategy plus the equal-weighted universe, the per-period returns
+    # (rebalance dates x strategies) and the timing / coverage report.
+    strategies = strategies or STRATEGY_DEFINITIONS; metrics = metrics or ScanMetrics(); metrics.start()
+    provider = instrument(provider or screener_engine.default_provider(), metrics)
+    tickers = list(tickers or provider.universe() or screener_engine.get_global_top_tickers()); periods_per_year = FREQUENCIES[frequency][1]
+    try:
+        with metrics.stage('load_prices'): closes = provider.closes(tickers, period=history_period(years))
+        with metrics.stage('load_fundamentals'): statements = load_statements(tickers, provider, metrics, lag_days)
+        closes = closes.loc[:, closes.notna().any()]
+        if closes.empty: raise ValueError("Keine Kursdaten für den Backtest verfügbar.")
+        rows = rebalance_rows(closes.index, closes.index[-1] - pd.DateOffset(years=years), frequency)
+        if len(rows) < 2: raise ValueError("Zu wenige Kursdaten für mindestens zwei Rebalancing-Termine.")
+        dates = closes.index[rows]
+        with metrics.stage('snapshots'): snapshots = snapshot_fundamentals(store, dates, closes.columns) if store is not None else {}
+        with metrics.stage('cube'): cube, price = build_cube(closes, statements, rows, snapshots)
+        with metrics.stage('score'): scores = score_cube(cube, strategies)
+        with metrics.stage('evaluate'): portfolio, benchmark, turnover, beats_median, ic, picks, held = evaluate(scores, price, top_n)
+    finally: metrics.finish()
+    summary = []
+    for j, name in enumerate(strategies):
+        with np.errstate(invalid='ignore'): hit_rate = np.nanmean(np.where(np.isnan(portfolio[j]), np.nan, portfolio[j] > benchmark))
+        row = {'Strategy': name, **performance(portfolio[j], periods_per_year)}
+        row.update({'ExcessCAGR': row['CAGR'] - performance(benchmark, periods_per_year)['CAGR'], 'HitRate': hit_rate * 100, 'PickHitRate': beats_median[j] * 100,
+                    'Turnover': np.nanmean(turnover[j]) * 100, 'MeanIC': np.nanmean(ic[:, j])})
+        summary.append(row)
+    summary.append({'Strategy': BENCHMARK, **performance(benchmark, periods_per_year)})
+    summary = pd.DataFrame(summary).set_index('Strategy').round(3)
+    returns = pd.DataFrame(np.vstack([portfolio, benchmark[None, :]]).T * 100, index=pd.DatetimeIndex(dates[:-1], name='Rebalance'), columns=[*strategies, BENCHMARK])
+    tradable = ~np.isnan(price); covered = np.zeros(len(dates), dtype=bool)
+    for values in snapshots.values(): covered |= ~np.isnan(values).all(axis=1)
+    metrics.counts.update(universe=len(tickers), priced=int(closes.shape[1]), with_statements=int(statements['Ticker'].nunique()), rebalances=len(rows))
+    coverage = {metric: round(float((~np.isnan(cube[i]) & tradable).sum() / max(tradable.sum(), 1)), 4) for i, metric in enumerate(METRICS_TO_RANK)}
+    metrics.info.update(provider=provider.name, start=str(dates[0].date()), end=str(dates[-1].date()), frequency=frequency, top_n=top_n, lag_days=lag_days,
+                        snapshot_dates=int(covered.sum()), coverage=coverage, uncovered_inputs=uncovered_inputs(coverage, strategies),
+                        latest_picks={name: closes.columns[picks[j][held[j]]].tolist() for j, name in enumerate(strategies)})
+    return summary, returns, metrics.report()
+
+# --- Command Line ---
+def make_provider(args):
+    if args.provider == 'synthetic': return SyntheticProvider(args.synthetic_size)
+    if args.provider == 'replay': return ReplayProvider(args.replay_dir)
+    if args.provider == 'cache': return CachedProvider(OfflineProvider(), ignore_ttl=True)
+    return CachedProvider(RateLimitedProvider(InstrumentedProvider(YFinanceProvider())))
+
+def print_summary(summary, report):
+    counts = report['counts']
+    print(f"\n{report['provider']}: {report['start']} .. {report['end']}, {counts['rebalances']} {report['frequency']} rebalances, "
+          f"{counts['priced']} of {counts['universe']} tickers priced, top {report['top_n']}, {report['wall_s']:.2f}s")
+    print(f"  {'strategy':<18}{'CAGR %':>9}{'excess %':>10}{'vol %':>8}{'Sharpe':>8}{'max DD %':>10}{'hit %':>8}{'picks %':>9}{'turnover %':>12}{'IC':>8}")
+    uncovered = report.get('uncovered_inputs', {})
+    for name, row in summary.iterrows():
+        cells = [row['CAGR'], row.get('ExcessCAGR'), row['Volatility'], row['Sharpe'], row['MaxDrawdown'], row.get('HitRate'), row.get('PickHitRate'), row.get('Turnover'), row.get('MeanIC')]
+        widths = (9, 10, 8, 8, 10, 8, 9, 12, 8)
+        print(f"  {name + (' *' if name in uncovered else ''):<18}" + "".join(f"{value:>{width}.2f}" if pd.notna(value) else f"{'-':>{width}}" for value, width in zip(cells, widths)))
+    timings = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in report['stages'].items())
+    coverage = ", ".join(f"{metric} {share:.0%}" for metric, share in report['coverage'].items())
+    print(f"  stages: {timings}\n  coverage: {coverage}")
+    for name, entry in uncovered.items():
+        print(f"  * {name}: {entry['weight']:.0%} of the weight is on metrics without data ({', '.join(entry['metrics'])}), ranked as neutral")
+    if any('DivYield' in entry['metrics'] for entry in uncovered.values()): print("    DivYield comes from scan snapshots only; see --snapshot-dir")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest of the Rectifex strategies over past rebalance dates.")
+    parser.add_argument('-u', '--universe', help="universe name or path to a JSON/CSV/TXT file (default: the provider's own universe, else global_top)")
+    parser.add_argument('-p', '--provider', choices=('yfinance', 'cache', 'synthetic', 'replay'), default='yfinance',
+                        help="yfinance reads through the local cache; cache serves cached payloads only, expired or not (default: yfinance)")
+    parser.add_argument('--replay-dir', metavar='DIR', help="capture directory for --provider replay")
+    parser.add_argument('--synthetic-size', type=int, default=500, metavar='N', help="tickers for --provider synthetic (default: 500)")
+    parser.add_argument('--years', type=int, default=DEFAULT_YEARS, help=f"backtest length in years (default: {DEFAULT_YEARS})")
+    parser.add_argument('--frequency', choices=FREQUENCIES, default='monthly', help="rebalancing frequency (default: monthly)")
+    parser.add_argument('--top', type=int, default=DEFAULT_TOP_N, metavar='N', help=f"stocks per portfolio (default: {DEFAULT_TOP_N})")
+    parser.add_argument('-s', '--strategy', action='append', help="strategy to test, repeatable (default: all)")
+    parser.add_argument('--lag-days', type=int, default=PUBLICATION_LAG_DAYS, help=f"days from fiscal year end until a statement is used (default: {PUBLICATION_LAG_DAYS})")
+    parser.add_argument('--no-snapshots', action='store_true', help="ignore the scan snapshot history, use statements only")
+    parser.add_argument('--snapshot-dir', metavar='DIR', help="snapshot store location")
+    parser.add_argument('--returns', metavar='PATH', help="write the per-period returns as CSV")
+    parser.add_argument('--json', metavar='PATH', help="write summary and report as JSON")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.strategy or [] if name not in STRATEGY_DEFINITIONS]
+    if unknown: parser.error(f"unknown strategy {', '.join(unknown)}; available: {', '.join(STRATEGY_DEFINITIONS)}")
+    if args.years < 1 or args.top < 1: parser.error("--years and --top must be at least 1")
+    if args.provider == 'replay' and not (args.replay_dir and os.path.isdir(args.replay_dir)): parser.error("--provider replay needs an existing --replay-dir")
+    tickers = None
+    if args.universe:
+        from universes import load_universe
+        try: tickers = load_universe(args.universe)
+        except (KeyError, OSError, ValueError) as e: parser.error(str(e))
+    strategies = {name: STRATEGY_DEFINITIONS[name] for name in args.strategy} if args.strategy else None
+    store = None if args.no_snapshots else SnapshotStore(args.snapshot_dir)
+    try: summary, returns, report = run_backtest(make_provider(args), tickers, args.years, args.top, args.frequency, strategies, args.lag_days, store)
+    except ValueError as e: print(f"backtest: {e}", file=sys.stderr); return 1
+    print_summary(summary, report)
+    if args.returns: returns.round(4).to_csv(args.returns)
+    if args.json: write_report({'summary': json.loads(summary.reset_index().to_json(orient='records')), 'report': report}, args.json)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+# =============================================================================
+# Rectifex - Scan Benchmark
+# Measures wall time, tickers/sec and peak memory of the fetch, dedup, rank and
+# score stages against an offline provider (synthetic or replay), no network.
+# Memory per stage is the Python allocation peak (tracemalloc) plus how far the
+# stage raised the process RSS high-water mark. The threaded fetch stage is only
+# traced with --trace-memory (much slower fetch).
+#
+#   python3 benchmark.py                          # synthetic, 200 / 2k / 20k tickers
+#   python3 benchmark.py --sizes 2000 --latency 0.005 --trace-memory
+#   python3 benchmark.py --replay ~/rectifex-capture --json results.json
+# =============================================================================
+
+import argparse
+import json
+import resource
+import time
+import tracemalloc
+
+import screener_engine
+import scoring_engine
+from data_providers import SyntheticProvider, ReplayProvider
+
+STAGES = ('fetch', 'dedup', 'rank', 'score')
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def run_stage(report, stage, n_tickers, func, *args, trace=True):
+    # Non-fetch stages are single-threaded pandas/numpy work, where tracemalloc costs little.
+    own_trace = trace and not tracemalloc.is_tracing()
+    if own_trace: tracemalloc.start()
+    if tracemalloc.is_tracing(): tracemalloc.reset_peak()
+    rss_before = peak_rss_mb(); start = time.perf_counter()
+    try:
+        result = func(*args)
+        elapsed = time.perf_counter() - start; rss_after = peak_rss_mb()
+        report[stage] = {'wall_s': round(elapsed, 4), 'tickers_per_s': round(n_tickers / elapsed, 1) if elapsed > 0 else None,
+                         'rss_growth_mb': round(rss_after - rss_before, 1), 'peak_rss_mb': round(rss_after, 1)}
+        if tracemalloc.is_tracing(): report[stage]['peak_traced_mb'] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+    finally:
+        if own_trace: tracemalloc.stop()
+    return result
+
+def benchmark(provider, tickers, strategy='Balanced', max_workers=screener_engine.MAX_WORKERS, trace_memory=False):
+    report = {'provider': provider.name, 'tickers': len(tickers)}
+    if trace_memory: tracemalloc.start()
+    try:
+        results, failed = run_stage(report, 'fetch', len(tickers), screener_engine.fetch_metrics, tickers, provider, None, max_workers, trace=False)
+        df = run_stage(report, 'dedup', len(tickers), screener_engine.deduplicate_metrics, results)
+        df = run_stage(report, 'rank', len(tickers), scoring_engine.rank_metrics, df)
+        final_df = run_stage(report, 'score', len(tickers), lambda ranked: scoring_engine.display_frame(scoring_engine.score_frame(ranked), strategy), df)
+    finally:
+        if trace_memory: tracemalloc.stop()
+    report['failed'] = failed; report['rows'] = len(final_df)
+    report['total_wall_s'] = round(sum(report[stage]['wall_s'] for stage in STAGES), 4)
+    return report
+
+def print_report(report):
+    print(f"\n{report['provider']}: {report['tickers']} tickers, {report['rows']} rows, {report['failed']} failed, {report['total_wall_s']:.2f}s total")
+    print(f"  {'stage':<8}{'wall [s]':>12}{'tickers/s':>14}{'RSS +[MB]':>12}{'peak RSS [MB]':>16}{'traced [MB]':>14}")
+    for stage in STAGES:
+        row = report[stage]; traced = f"{row['peak_traced_mb']:.2f}" if 'peak_traced_mb' in row else '-'
+        print(f"  {stage:<8}{row['wall_s']:>12.4f}{row['tickers_per_s'] or 0:>14,.0f}{row['rss_growth_mb']:>12.1f}{row['peak_rss_mb']:>16.1f}{traced:>14}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the Rectifex scan pipeline.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[200, 2000, 20000], help="universe sizes for the synthetic provider")
+    parser.add_argument('--latency', type=float, default=0.0, help="simulated seconds per provider call")
+    parser.add_argument('--workers', type=int, default=screener_engine.MAX_WORKERS)
+    parser.add_argument('--replay', metavar='DIR', help="benchmark a recorded capture instead of synthetic data")
+    parser.add_argument('--strategy', default='Balanced')
+    parser.add_argument('--trace-memory', action='store_true', help="also trace the fetch stage with tracemalloc")
+    parser.add_argument('--json', metavar='PATH', help="also write the reports as JSON")
+    args = parser.parse_args()
+    if args.replay:
+        provider = ReplayProvider(args.replay); runs = [(provider, provider.universe())]
+    else:
+        runs = [(provider, provider.universe()) for provider in (SyntheticProvider(n, latency=args.latency) for n in args.sizes)]
+    reports = []
+    for provider, tickers in runs:
+        report = benchmark(provider, tickers, args.strategy, args.workers, args.trace_memory); print_report(report); reports.append(report)
+    if args.json:
+        with open(args.json, 'w') as f: json.dump(reports, f, indent=2)
+
+if __name__ == "__main__":
+    main()
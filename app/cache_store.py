@@ -0,0 +1,127 @@
+# =============================================================================
+# Rectifex - Cache Store
+# Persistent on-disk cache (SQLite under the XDG cache dir) for per-ticker
+# payloads, with a TTL per data class and size-bounded LRU eviction.
+# =============================================================================
+
+import os
+import time
+import pickle
+import sqlite3
+import threading
+
+import pandas as pd
+
+from data_providers import DataProvider, closes_frame
+
+# info carries the quote (price, P/E, P/B, market cap, dividend rate) next to the profile, so it expires with the prices.
+DATA_CLASSES = {'info': 'prices', 'history': 'prices', 'financials': 'fundamentals', 'balance_sheet': 'fundamentals'}
+DEFAULT_TTLS = {'fundamentals': 28 * 86400, 'prices': 4 * 3600}
+DEFAULT_MAX_BYTES = 512 * 2**20
+EVICTION_INTERVAL = 64
+
+def default_cache_dir():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'rectifex')
+
+def is_empty(payload):
+    return payload is None or (hasattr(payload, 'empty') and payload.empty) or (isinstance(payload, dict) and not payload)
+
+class CacheStore:
+    def __init__(self, path=None, ttls=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path or os.path.join(default_cache_dir(), 'cache.sqlite')
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}; self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._local = threading.local(); self._lock = threading.Lock(); self._writes = 0
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS payloads (symbol TEXT NOT NULL, endpoint TEXT NOT NULL, data_class TEXT NOT NULL, "
+                         "fetched_at REAL NOT NULL, accessed_at REAL NOT NULL, size INTEGER NOT NULL, payload BLOB NOT NULL, PRIMARY KEY (symbol, endpoint))")
+            conn.execute("CREATE INDEX IF NOT EXISTS payloads_accessed ON payloads (accessed_at)")
+
+    def __getstate__(self):
+        # Worker processes open their own connections to the same file.
+        return {'path': self.path, 'ttls': self.ttls, 'max_bytes': self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state); self._local = threading.local(); self._lock = threading.Lock(); self._writes = 0
+
+    def _connection(self):
+        # SQLite connections must not be shared between threads, so every executor worker gets its own.
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30); conn.execute("PRAGMA journal_mode=WAL"); conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, symbol, endpoint, data_class, ignore_ttl=False):
+        conn = self._connection()
+        row = conn.execute("SELECT fetched_at, payload FROM payloads WHERE symbol = ? AND endpoint = ?", (symbol, endpoint)).fetchone()
+        if row is None or (not ignore_ttl and time.time() - row[0] > self.ttls[data_class]): return None
+        with conn: conn.execute("UPDATE payloads SET accessed_at = ? WHERE symbol = ? AND endpoint = ?", (time.time(), symbol, endpoint))
+        return pickle.loads(row[1])
+
+    def put(self, symbol, endpoint, data_class, payload):
+        blob = pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL); now = time.time(); conn = self._connection()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO payloads VALUES (?, ?, ?, ?, ?, ?, ?)", (symbol, endpoint, data_class, now, now, len(blob), blob))
+        with self._lock:
+            self._writes += 1; due = self._writes % EVICTION_INTERVAL == 0
+        if due: self.evict()
+
+    def evict(self):
+        # Drops least recently used payloads until the store is back under 90% of max_bytes.
+        conn = self._connection()
+        with conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM payloads").fetchone()[0]
+            if total <= self.max_bytes: return 0
+            removed = 0
+            for symbol, endpoint, size in conn.execute("SELECT symbol, endpoint, size FROM payloads ORDER BY accessed_at").fetchall():
+                if total <= self.max_bytes * 0.9: break
+                conn.execute("DELETE FROM payloads WHERE symbol = ? AND endpoint = ?", (symbol, endpoint)); total -= size; removed += 1
+        return removed
+
+    def clear(self):
+        with self._connection() as conn: conn.execute("DELETE FROM payloads")
+
+class CachedProvider(DataProvider):
+    # Read-through cache in front of another provider. force_refresh skips cache reads but still stores fresh payloads;
+    # ignore_ttl serves expired payloads too (cache-only scans). Hits and misses go to .metrics when a scan sets it.
+    metrics = None
+    def __init__(self, source, store=None, force_refresh=False, ignore_ttl=False):
+        self.source = source; self.store = store or CacheStore(); self.force_refresh = force_refresh; self.ignore_ttl = ignore_ttl
+        self.name = f'cached-{source.name}'
+
+    def universe(self): return self.source.universe()
+
+    def _cached(self, symbol, endpoint, key, fetch):
+        data_class = DATA_CLASSES[endpoint]
+        if not self.force_refresh:
+            payload = self.store.get(symbol, key, data_class, self.ignore_ttl)
+            if self.metrics is not None: self.metrics.cache_lookup(data_class, payload is not None, payload is None)
+            if payload is not None: return payload
+        payload = fetch()
+        if not is_empty(payload): self.store.put(symbol, key, data_class, payload)
+        return payload
+
+    def closes(self, symbols, period='1y'):
+        # Closes are cached as per-symbol history payloads; only the misses go out in one bulk download.
+        key = f'history:{period}'; columns = {}
+        if not self.force_refresh:
+            for symbol in symbols:
+                payload = self.store.get(symbol, key, 'prices', self.ignore_ttl)
+                if payload is not None and 'Close' in payload: columns[symbol] = payload['Close']
+        missing = [symbol for symbol in symbols if symbol not in columns]
+        if self.metrics is not None and not self.force_refresh: self.metrics.cache_lookup('prices', len(columns), len(missing))
+        if missing:
+            fetched = self.source.closes(missing, period)
+            for symbol in missing:
+                if symbol not in fetched.columns: continue
+                series = fetched[symbol].dropna()
+                if not series.empty: self.store.put(symbol, key, 'prices', pd.DataFrame({'Close': series})); columns[symbol] = series
+        return closes_frame(columns, symbols)
+
+    def quotes(self, symbols): return self.source.quotes(symbols)
+    def info(self, symbol): return self._cached(symbol, 'info', 'info', lambda: self.source.info(symbol))
+    def history(self, symbol, period='1y'): return self._cached(symbol, 'history', f'history:{period}', lambda: self.source.history(symbol, period))
+    def financials(self, symbol): return self._cached(symbol, 'financials', 'financials', lambda: self.source.financials(symbol))
+    def balance_sheet(self, symbol): return self._cached(symbol, 'balance_sheet', 'balance_sheet', lambda: self.source.balance_sheet(symbol))
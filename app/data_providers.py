@@ -0,0 +1,215 @@
+# =============================================================================
+# Rectifex - Data Providers
+# Pluggable sources for the per-ticker payloads used by the screener engine:
+# live yfinance, record/replay from disk and a synthetic offline universe.
+# =============================================================================
+
+import os
+import time
+import pickle
+import zlib
+import threading
+import numpy as np
+import pandas as pd
+
+ENDPOINTS = ('info', 'history', 'financials', 'balance_sheet')
+PRICE_CHUNK_SIZE = 200
+YAHOO_PERIODS = ('1d', '5d', '1mo', '3mo', '6mo', '1y', '2y', '5y', '10y', 'ytd', 'max')
+
+def chunked(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def close_series(series):
+    # Per-ticker histories carry exchange-local timestamps; the aligned matrix is indexed by plain trading dates.
+    index = pd.DatetimeIndex(series.index)
+    if index.tz is not None: index = index.tz_localize(None)
+    days = index.to_numpy(dtype='datetime64[ns]').astype('datetime64[D]').astype('datetime64[ns]')
+    # One close per day in ascending order is the normal case and needs no groupby (the slow part of a cached closes()).
+    if len(days) < 2 or (days[1:] > days[:-1]).all(): return pd.Series(series.to_numpy(dtype=float), index=pd.DatetimeIndex(days))
+    return pd.Series(series.to_numpy(dtype=float), index=pd.DatetimeIndex(days)).groupby(level=0).last()
+
+def closes_frame(columns, symbols):
+    frame = pd.concat({symbol: close_series(col) for symbol, col in columns.items()}, axis=1) if columns else pd.DataFrame()
+    return frame.reindex(columns=list(symbols)).sort_index()
+
+def period_range(period):
+    # Yahoo only accepts fixed periods; any other year count ('11y', e.g. a backtest plus warm-up) becomes a start date.
+    if period in YAHOO_PERIODS or not period.endswith('y'): return {'period': period}
+    return {'start': (pd.Timestamp.today().normalize() - pd.DateOffset(years=int(period[:-1]))).strftime('%Y-%m-%d')}
+
+def provider_chain(provider):
+    # The provider and every provider it wraps (cache, rate limiter, instrumentation layers expose .source).
+    while provider is not None:
+        yield provider; provider = getattr(provider, 'source', None)
+
+# --- Provider Interface ---
+class DataProvider:
+    name = 'base'
+    def universe(self): return None
+    def info(self, symbol): raise NotImplementedError
+    def history(self, symbol, period='1y'): raise NotImplementedError
+    def financials(self, symbol): raise NotImplementedError
+    def balance_sheet(self, symbol): raise NotImplementedError
+    def closes(self, symbols, period='1y'):
+        # Dates x symbols matrix of closing prices. Providers with a bulk endpoint override this.
+        columns = {symbol: self.history(symbol, period).get('Close') for symbol in symbols}
+        return closes_frame({symbol: col for symbol, col in columns.items() if col is not None}, symbols)
+    def quotes(self, symbols):
+        # Latest price per symbol (NaN if unknown) from a short bulk close download; never cached.
+        frame = self.closes(symbols, period='5d')
+        return frame.ffill().iloc[-1].reindex(list(symbols)) if len(frame) else pd.Series(np.nan, index=list(symbols))
+    def fetch(self, symbol, endpoint):
+        return self.history(symbol) if endpoint == 'history' else getattr(self, endpoint)(symbol)
+
+# --- Live Data (Yahoo Finance) ---
+def yfinance():
+    # Imported on first use: yfinance is slow to import and not needed for offline providers or a CLI --help.
+    import yfinance as yf
+    return yf
+
+class YFinanceProvider(DataProvider):
+    name = 'yfinance'
+    def info(self, symbol): return yfinance().Ticker(symbol).info
+    def history(self, symbol, period='1y'): return yfinance().Ticker(symbol).history(**period_range(period), auto_adjust=True)
+    def financials(self, symbol): return yfinance().Ticker(symbol).financials
+    def balance_sheet(self, symbol): return yfinance().Ticker(symbol).balance_sheet
+    def closes(self, symbols, period='1y'):
+        frames = []
+        for chunk in chunked(list(symbols), PRICE_CHUNK_SIZE):
+            data = yfinance().download(chunk, **period_range(period), auto_adjust=True, progress=False, threads=True, group_by='column')
+            if data is None or data.empty: continue
+            close = data['Close']
+            frames.append(close.to_frame(chunk[0]) if isinstance(close, pd.Series) else close)
+        if not frames: return closes_frame({}, symbols)
+        frame = pd.concat(frames, axis=1)
+        return closes_frame({symbol: frame[symbol] for symbol in frame.columns.unique()}, symbols)
+
+# --- Record & Replay ---
+class ReplayProvider(DataProvider):
+    # Serves payloads captured under <directory>/<symbol>/<endpoint>.pkl. With a source provider,
+    # missing payloads are fetched live and written to disk (record mode).
+    name = 'replay'
+    def __init__(self, directory, source=None):
+        self.directory = directory; self.source = source
+        os.makedirs(directory, exist_ok=True)
+
+    def universe(self):
+        return sorted(entry for entry in os.listdir(self.directory) if os.path.isdir(os.path.join(self.directory, entry)))
+
+    def _path(self, symbol, endpoint): return os.path.join(self.directory, symbol, f'{endpoint}.pkl')
+
+    def _load(self, symbol, endpoint, empty):
+        path = self._path(symbol, endpoint)
+        if os.path.exists(path):
+            with open(path, 'rb') as f: return pickle.load(f)
+        if self.source is None: return empty
+        payload = self.source.fetch(symbol, endpoint); self._store(symbol, endpoint, payload)
+        return payload
+
+    def _store(self, symbol, endpoint, payload):
+        path = self._path(symbol, endpoint); os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Per thread, not per process: a retried ticker can be recorded again while its abandoned attempt is still writing.
+        tmp_path = f'{path}.{os.getpid()}-{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f: pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def closes(self, symbols, period='1y'):
+        recorded = [symbol for symbol in symbols if os.path.exists(self._path(symbol, 'history')) or self.source is None]
+        columns = {symbol: self.history(symbol, period).get('Close') for symbol in recorded}
+        missing = [symbol for symbol in symbols if symbol not in columns]
+        if missing:
+            fetched = self.source.closes(missing, period)
+            for symbol in missing:
+                series = fetched[symbol].dropna() if symbol in fetched.columns else pd.Series(dtype=float)
+                if not series.empty: self._store(symbol, 'history', pd.DataFrame({'Close': series})); columns[symbol] = series
+        return closes_frame({symbol: col for symbol, col in columns.items() if col is not None}, symbols)
+
+    def info(self, symbol): return self._load(symbol, 'info', {})
+    def history(self, symbol, period='1y'): return self._load(symbol, 'history', pd.DataFrame())
+    def financials(self, symbol): return self._load(symbol, 'financials', pd.DataFrame())
+    def balance_sheet(self, symbol): return self._load(symbol, 'balance_sheet', pd.DataFrame())
+
+class OfflineProvider(DataProvider):
+    # Answers every request with "no data"; behind a CachedProvider this gives a cache-only scan without network access.
+    name = 'offline'
+    def info(self, symbol): return {}
+    def history(self, symbol, period='1y'): return pd.DataFrame()
+    def financials(self, symbol): return pd.DataFrame()
+    def balance_sheet(self, symbol): return pd.DataFrame()
+    def closes(self, symbols, period='1y'): return closes_frame({}, symbols)
+
+# --- Synthetic Universe ---
+class SyntheticProvider(DataProvider):
+    # Deterministic fake universe of n tickers for offline benchmarks; latency (seconds) is slept on every call.
+    name = 'synthetic'
+    SECTORS = ['Technology', 'Healthcare', 'Financial Services', 'Energy', 'Industrials', 'Consumer Defensive', 'Utilities']
+    COUNTRIES = {'USD': 'United States', 'EUR': 'Germany', 'GBP': 'United Kingdom', 'JPY': 'Japan', 'CHF': 'Switzerland', 'CAD': 'Canada'}
+    PERIOD_DAYS = {'5d': 5, '1mo': 21, '3mo': 63, '6mo': 126, '1y': 252, '2y': 504, '5y': 1260, '10y': 2520, 'max': 5040}
+
+    def __init__(self, n_tickers=200, latency=0.0, failure_rate=0.02, seed=0):
+        self.n_tickers = n_tickers; self.latency = latency; self.failure_rate = failure_rate; self.seed = seed
+        self.end_date = pd.Timestamp('2025-06-30'); self.dates = pd.bdate_range(end=self.end_date, periods=252); self._calendars = {252: self.dates}
+        self.statement_dates = pd.DatetimeIndex([self.end_date - pd.DateOffset(years=i) for i in range(4)])
+
+    def universe(self): return [f'SYN{i:05d}' for i in range(self.n_tickers)]
+
+    def _rng(self, symbol, salt, simulate_latency=True):
+        if simulate_latency and self.latency: time.sleep(self.latency)
+        return np.random.default_rng([self.seed, zlib.crc32(symbol.encode()), salt])
+
+    def info(self, symbol): return self._info(symbol)
+
+    def _info(self, symbol, simulate_latency=True):
+        rng = self._rng(symbol, 0, simulate_latency)
+        if rng.random() < self.failure_rate: return {}
+        # The quote is the last close of the price path, as with live data.
+        currency = rng.choice(list(self.COUNTRIES)); rng.lognormal(4, 1); price = float(self._close_path(symbol, 1, False)[-1])
+        return {'quoteType': 'EQUITY', 'longName': f'Synthetic {symbol} Corp', 'sector': str(rng.choice(self.SECTORS)),
+                'country': self.COUNTRIES[currency], 'currency': str(currency), 'marketCap': float(rng.lognormal(23, 1.5)),
+                'trailingPE': float(rng.normal(20, 12)), 'priceToBook': float(rng.lognormal(1, 0.7)),
+                'regularMarketPrice': price, 'dividendRate': float(price * max(rng.normal(0.02, 0.015), 0))}
+
+    def _calendar(self, period):
+        n_days = self.PERIOD_DAYS.get(period) or (252 * int(period[:-1]) if period.endswith('y') else 252)
+        if n_days not in self._calendars: self._calendars[n_days] = pd.bdate_range(end=self.end_date, periods=n_days)
+        return self._calendars[n_days]
+
+    def _close_path(self, symbol, n_days, simulate_latency=True):
+        # Generated backwards from the latest close, so a longer period extends the same path into the past.
+        rng = self._rng(symbol, 1, simulate_latency); last_close = rng.lognormal(4, 1)
+        returns = rng.normal(0.0003, rng.uniform(0.008, 0.03), n_days - 1)
+        return last_close * np.exp(-np.concatenate([[0.0], np.cumsum(returns)]))[::-1]
+
+    def history(self, symbol, period='1y'):
+        dates = self._calendar(period)
+        return pd.DataFrame({'Close': self._close_path(symbol, len(dates))}, index=dates)
+
+    def closes(self, symbols, period='1y'):
+        # One simulated round trip per chunk, like the bulk download of the live provider.
+        dates = self._calendar(period); columns = {}
+        for chunk in chunked(list(symbols), PRICE_CHUNK_SIZE):
+            if self.latency: time.sleep(self.latency)
+            columns.update({symbol: self._close_path(symbol, len(dates), simulate_latency=False) for symbol in chunk})
+        return pd.DataFrame(columns, index=dates, columns=list(symbols))
+
+    def quotes(self, symbols):
+        # Intraday move of a few percent around the last close, one simulated round trip per chunk.
+        prices = {}
+        for chunk in chunked(list(symbols), PRICE_CHUNK_SIZE):
+            if self.latency: time.sleep(self.latency)
+            for symbol in chunk:
+                price = self._info(symbol, simulate_latency=False).get('regularMarketPrice', np.nan)
+                prices[symbol] = price * np.exp(self._rng(symbol, 4, simulate_latency=False).normal(0, 0.015))
+        return pd.Series(prices, index=list(symbols), dtype=float)
+
+    def financials(self, symbol):
+        rng = self._rng(symbol, 2)
+        revenue = rng.lognormal(22, 1.5) / np.cumprod(1 + rng.normal(0.06, 0.08, 4))
+        net_income = revenue * rng.normal(0.1, 0.08, 4)
+        return pd.DataFrame([revenue, net_income], index=['Total Revenue', 'Net Income'], columns=self.statement_dates)
+
+    def balance_sheet(self, symbol):
+        rng = self._rng(symbol, 3)
+        equity = rng.lognormal(22, 1.5) * rng.uniform(0.8, 1.2, 4)
+        liabilities = equity * rng.lognormal(0, 0.6, 4)
+        return pd.DataFrame([equity, liabilities], index=['Stockholders Equity', 'Total Liab'], columns=self.statement_dates)
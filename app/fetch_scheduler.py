@@ -0,0 +1,201 @@
+# =============================================================================
+# Rectifex - Fetch Scheduler
+# Runs the per-ticker fetch tasks with a process-wide token-bucket rate limit,
+# adaptive concurrency (AIMD on HTTP 429 / timeouts), enforced per-ticker
+# deadlines, jittered retries, failure classification and cancellation.
+# =============================================================================
+
+import heapq
+import math
+import queue
+import random
+import socket
+import ssl
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+
+from data_providers import DataProvider, PRICE_CHUNK_SIZE
+
+RETRYABLE_REASONS = ('rate_limited', 'timeout', 'network')
+WORKER_IDLE_TIMEOUT = 5.0
+FAILURE_LABELS_DE = {'rate_limited': 'Rate-Limit', 'timeout': 'Zeitüberschreitung', 'network': 'Netzwerk', 'no_data': 'Keine Daten',
+                     'not_equity': 'Keine Aktie', 'error': 'Sonstige Fehler', 'cancelled': 'Abgebrochen'}
+
+class FetchError(Exception):
+    def __init__(self, reason, message=''):
+        super().__init__(message or reason); self.reason = reason
+
+class ScanCancelled(Exception):
+    pass
+
+NETWORK_ERRORS = ('ConnectionError', 'SSLError', 'ChunkedEncodingError')
+MISSING_DATA_ERRORS = ('YFTickerMissingError', 'YFPricesMissingError')
+
+def classify_error(exc):
+    # Matched by class names along the MRO, so neither requests, curl_cffi nor yfinance has to be imported. Their
+    # exceptions all subclass OSError, as do local file errors, so OSError alone says nothing about the network.
+    if isinstance(exc, FetchError): return exc.reason
+    names = {cls.__name__ for cls in type(exc).__mro__}; text = str(exc)
+    status = getattr(getattr(exc, 'response', None), 'status_code', None)
+    if any('RateLimit' in name for name in names) or status == 429 or '429' in text or 'Too Many Requests' in text: return 'rate_limited'
+    if isinstance(exc, TimeoutError) or any('Timeout' in name for name in names): return 'timeout'
+    if names & set(MISSING_DATA_ERRORS) or status == 404: return 'no_data'
+    # Other 4xx answers will not change on a retry; 5xx are upstream hiccups and retried like connection errors.
+    if isinstance(status, int) and 400 <= status < 500: return 'error'
+    if isinstance(status, int) and status >= 500: return 'network'
+    if isinstance(exc, (ConnectionError, ssl.SSLError, socket.gaierror)) or names & set(NETWORK_ERRORS): return 'network'
+    return 'error'
+
+class CancelToken:
+    # Wraps a threading.Event, or a multiprocessing Manager().Event() proxy when worker processes share the token.
+    def __init__(self, event=None): self._event = event if event is not None else threading.Event()
+    def cancel(self): self._event.set()
+    @property
+    def cancelled(self): return self._event.is_set()
+    def wait(self, timeout): return self._event.wait(timeout)
+
+# --- Rate Limiting ---
+class TokenBucket:
+    # Shared by every request to the same upstream; penalize() halves the rate after throttling, reward() recovers it slowly.
+    def __init__(self, rate=10.0, burst=10, min_rate=0.5):
+        self.max_rate = rate; self.rate = rate; self.burst = burst; self.min_rate = min_rate
+        self._tokens = float(burst); self._updated = time.monotonic(); self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy(); del state['_lock']; return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state); self._lock = threading.Lock(); self._tokens = float(self.burst); self._updated = time.monotonic()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate); self._updated = now
+
+    def acquire(self, tokens=1, cancel_token=None):
+        while True:
+            with self._lock:
+                now = time.monotonic(); self._refill(now)
+                if self._tokens >= tokens: self._tokens -= tokens; return
+                delay = (tokens - self._tokens) / self.rate
+            if cancel_token is not None and cancel_token.wait(delay): raise ScanCancelled()
+            elif cancel_token is None: time.sleep(delay)
+
+    def penalize(self):
+        with self._lock: self._refill(time.monotonic()); self.rate = max(self.min_rate, self.rate / 2); self._tokens = 0.0
+
+    def reward(self):
+        with self._lock: self.rate = min(self.max_rate, self.rate * 1.05)
+
+DEFAULT_RATE_LIMITER = TokenBucket()
+
+class RateLimitedProvider(DataProvider):
+    # Takes a token per upstream request; placed below the cache so cache hits are never throttled.
+    def __init__(self, source, limiter=None):
+        self.source = source; self.limiter = limiter or DEFAULT_RATE_LIMITER; self.name = source.name
+
+    def universe(self): return self.source.universe()
+    def info(self, symbol): self.limiter.acquire(); return self.source.info(symbol)
+    def history(self, symbol, period='1y'): self.limiter.acquire(); return self.source.history(symbol, period)
+    def financials(self, symbol): self.limiter.acquire(); return self.source.financials(symbol)
+    def balance_sheet(self, symbol): self.limiter.acquire(); return self.source.balance_sheet(symbol)
+    def _bulk_tokens(self, symbols): return min(self.limiter.burst, max(1, math.ceil(len(symbols) / PRICE_CHUNK_SIZE)))
+    def closes(self, symbols, period='1y'): self.limiter.acquire(self._bulk_tokens(symbols)); return self.source.closes(symbols, period)
+    def quotes(self, symbols): self.limiter.acquire(self._bulk_tokens(symbols)); return self.source.quotes(symbols)
+
+# --- Worker Threads ---
+class WorkerPool:
+    # Daemon threads that grow on demand and exit after WORKER_IDLE_TIMEOUT without work, so finished scans leave no
+    # threads behind. A request that blows its deadline is abandoned, not joined: its thread stays blocked while a
+    # fresh one takes over, and it never holds up interpreter shutdown. threads counts every thread ever started.
+    def __init__(self):
+        self._queue = queue.SimpleQueue(); self._lock = threading.Lock(); self._idle = 0; self.threads = 0; self.busy_seconds = 0.0
+
+    def submit(self, fn, *args):
+        future = Future(); self._queue.put((future, fn, args))
+        with self._lock:
+            spawn = self._idle == 0
+            if spawn: self.threads += 1
+            else: self._idle -= 1
+        if spawn: threading.Thread(target=self._worker, daemon=True).start()
+        return future
+
+    def _worker(self):
+        while True:
+            try: future, fn, args = self._queue.get(timeout=WORKER_IDLE_TIMEOUT)
+            except queue.Empty:
+                # Only leave while still counted idle; otherwise submit() has just handed this thread a job.
+                with self._lock:
+                    if self._idle > 0: self._idle -= 1; return
+                continue
+            start = time.perf_counter()
+            if future.set_running_or_notify_cancel():
+                try: future.set_result(fn(*args))
+                except BaseException as e: future.set_exception(e)
+            with self._lock: self._idle += 1; self.busy_seconds += time.perf_counter() - start
+
+class FetchOutcome:
+    __slots__ = ('symbol', 'result', 'reason', 'error', 'attempts')
+    def __init__(self, symbol, result=None, reason=None, error=None, attempts=1):
+        self.symbol = symbol; self.result = result; self.reason = reason; self.error = error; self.attempts = attempts
+    @property
+    def ok(self): return self.reason is None
+
+# --- Scheduler ---
+class FetchScheduler:
+    def __init__(self, max_workers=16, initial_workers=8, min_workers=1, deadline=20.0, retries=2, backoff=1.0,
+                 limiter=None, cancel_token=None):
+        self.max_workers = max_workers; self.min_workers = min_workers; self.concurrency = min(initial_workers, max_workers)
+        self.deadline = deadline; self.retries = retries; self.backoff = backoff
+        self.limiter = limiter or DEFAULT_RATE_LIMITER; self.cancel_token = cancel_token or CancelToken()
+        self.pool = WorkerPool(); self.failures = Counter(); self.retry_count = 0; self.retry_reasons = Counter(); self._success_streak = 0
+        # Utilization counters: time-integral of requests in flight, peaks and total run() time.
+        self.in_flight_seconds = 0.0; self.run_seconds = 0.0; self.peak_in_flight = 0; self.peak_concurrency = self.concurrency
+
+    def submit(self, fn, *args): return self.pool.submit(fn, *args)
+
+    def _throttled(self):
+        # Multiplicative decrease on throttling or hung requests.
+        self.concurrency = max(self.min_workers, self.concurrency // 2); self._success_streak = 0; self.limiter.penalize()
+
+    def _succeeded(self):
+        # Additive increase: one more slot after a full window of clean completions.
+        self._success_streak += 1; self.limiter.reward()
+        if self._success_streak >= self.concurrency:
+            self.concurrency = min(self.max_workers, self.concurrency + 1); self._success_streak = 0; self.peak_concurrency = max(self.peak_concurrency, self.concurrency)
+
+    def _backoff_delay(self, attempt):
+        return self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+
+    def run(self, symbols, task):
+        # Yields one FetchOutcome per symbol as soon as it is final. On cancellation, in-flight requests are abandoned
+        # and the remaining symbols are reported with reason 'cancelled'.
+        ready = deque((symbol, 1) for symbol in symbols); delayed = []; in_flight = {}; sequence = 0; last = time.monotonic()
+        while ready or delayed or in_flight:
+            now = time.monotonic(); self.in_flight_seconds += len(in_flight) * (now - last); self.run_seconds += now - last; last = now
+            if self.cancel_token.cancelled:
+                for symbol, attempt in list(ready) + [(s, a) for _, _, s, a in delayed] + [(s, a) for s, a, _ in in_flight.values()]:
+                    self.failures['cancelled'] += 1; yield FetchOutcome(symbol, reason='cancelled', attempts=attempt)
+                return
+            now = time.monotonic()
+            while delayed and delayed[0][0] <= now:
+                _, _, symbol, attempt = heapq.heappop(delayed); ready.append((symbol, attempt))
+            while ready and len(in_flight) < self.concurrency:
+                symbol, attempt = ready.popleft(); in_flight[self.pool.submit(task, symbol)] = (symbol, attempt, now + self.deadline)
+            self.peak_in_flight = max(self.peak_in_flight, len(in_flight))
+            wake_at = min([deadline for _, _, deadline in in_flight.values()] + ([delayed[0][0]] if delayed else []) + [now + 0.25])
+            if in_flight: done, _ = wait(list(in_flight), timeout=max(0.0, wake_at - now), return_when=FIRST_COMPLETED)
+            else: done = set(); self.cancel_token.wait(max(0.0, wake_at - now))
+            now = time.monotonic()
+            expired = [future for future, (_, _, deadline) in in_flight.items() if future not in done and deadline <= now]
+            for future in list(done) + expired:
+                symbol, attempt, _ = in_flight.pop(future)
+                if future in done and future.exception() is None:
+                    self._succeeded(); yield FetchOutcome(symbol, future.result(), attempts=attempt); continue
+                error = future.exception() if future in done else TimeoutError(f"no response after {self.deadline:.0f}s")
+                reason = classify_error(error)
+                if reason in ('rate_limited', 'timeout'): self._throttled()
+                if reason in RETRYABLE_REASONS and attempt <= self.retries:
+                    self.retry_count += 1; self.retry_reasons[reason] += 1; sequence += 1
+                    heapq.heappush(delayed, (now + self._backoff_delay(attempt), sequence, symbol, attempt + 1)); continue
+                self.failures[reason] += 1; yield FetchOutcome(symbol, reason=reason, error=error, attempts=attempt)
@@ -37,6 +37,7 @@ Ein hoher `Value_Score` bedeutet beispielsweise nur, dass eine Aktie im Vergleic
 *   **High Growth:** Fokus auf Umsatzwachstum und Profitabilität.
 *   **Deep Value:** Fokus auf aktuell günstig bewertete Aktien.
 *   **Quality Dividend:** Fokus auf profitable, stabile Dividendenzahler.
+*   **Custom:** Eigene Gewichtung der sechs Dimensionen. Der Wechsel der Strategie oder der Gewichte bewertet das letzte Scan-Ergebnis sofort neu, ohne Daten erneut abzurufen.
 
 ---
 
@@ -87,6 +88,7 @@ For example, a high `Value_Score` only means that a stock is *quantitatively* ch
 *   **High Growth:** Focus on revenue growth and profitability.
 *   **Deep Value:** Focus on currently cheaply valued stocks.
 *   **Quality Dividend:** Focus on profitable, stable dividend payers.
+*   **Custom:** Your own weighting of the six dimensions. Switching strategies or weights re-scores the last scan instantly without fetching any data again.
 
 ---
 
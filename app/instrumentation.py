@@ -0,0 +1,238 @@
+# =============================================================================
+# Rectifex - Scan Instrumentation
+# Per-scan metrics: stage wall times, per-endpoint request latencies and
+# errors by cause, retries, cache hit ratios and worker-pool utilization, with
+# an optional cProfile / tracemalloc hook. A scan returns them as a plain JSON
+# report; write_prometheus() renders that report in the Prometheus text format
+# (e.g. for the node_exporter textfile collector).
+# =============================================================================
+
+import os
+import io
+import sys
+import json
+import logging
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+from data_providers import DataProvider, provider_chain
+from fetch_scheduler import classify_error
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 60.0)
+PROFILE_MODES = ('cprofile', 'tracemalloc')
+PROFILE_TOP = 25
+REPORT_VERSION = 1
+# Since 3.12 cProfile runs on sys.monitoring: one profiler sees every thread, and a second active one raises ValueError.
+PER_THREAD_PROFILES = sys.version_info < (3, 12)
+
+# --- Profiling ---
+class ScanProfiler:
+    # Before 3.12 cProfile only sees the thread that enables it, so every fetch task gets its own profiler (wrap) and
+    # all of them are merged with the scan thread's when the scan stops. From 3.12 on the scan thread's profiler covers
+    # all threads. tracemalloc covers all threads by itself.
+    def __init__(self, mode, path=None):
+        if mode not in PROFILE_MODES: raise ValueError(f"Unknown profile mode '{mode}', expected one of {', '.join(PROFILE_MODES)}")
+        self.mode = mode; self.path = path; self.profiles = []; self._local = threading.local(); self._lock = threading.Lock(); self.result = None; self.main = None; self.error = None
+
+    def start(self):
+        if self.mode == 'tracemalloc': tracemalloc.start(); return
+        self.main = cProfile.Profile()
+        # Another profiler or debugger already holding the monitoring slot must not fail the scan: it runs unprofiled.
+        try: self.main.enable()
+        except ValueError as e: logging.warning(f"cProfile nicht verfügbar, Scan läuft ohne Profiling: {e}"); self.main = None; self.error = str(e); return
+        self.profiles.append(self.main)
+
+    def wrap(self, task):
+        if self.mode != 'cprofile' or not PER_THREAD_PROFILES or self.main is None: return task
+        def profiled(*args):
+            profile = getattr(self._local, 'profile', None)
+            if profile is None:
+                profile = self._local.profile = cProfile.Profile()
+                with self._lock: self.profiles.append(profile)
+            return profile.runcall(task, *args)
+        return profiled
+
+    def stop(self):
+        if self.result is not None: return self.result
+        if self.mode == 'tracemalloc':
+            snapshot = tracemalloc.take_snapshot(); peak = tracemalloc.get_traced_memory()[1]; tracemalloc.stop()
+            top = [{'site': str(stat.traceback), 'size_mb': round(stat.size / 2**20, 3), 'count': stat.count} for stat in snapshot.statistics('lineno')[:PROFILE_TOP]]
+            self.result = {'mode': 'tracemalloc', 'peak_mb': round(peak / 2**20, 2), 'top': top}; return self.result
+        if self.main is None: self.result = {'mode': 'cprofile', 'error': self.error, 'top': []}; return self.result
+        self.main.disable(); stream = io.StringIO()
+        with self._lock: stats = pstats.Stats(*self.profiles, stream=stream)
+        if self.path: stats.dump_stats(self.path)
+        top = [{'function': f"{func[0]}:{func[1]}({func[2]})", 'calls': nc, 'tottime_s': round(tt, 4), 'cumtime_s': round(ct, 4)}
+               for func, (cc, nc, tt, ct, callers) in sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP]]
+        self.result = {'mode': 'cprofile', 'path': self.path, 'threads': len(self.profiles), 'top': top}; return self.result
+
+# --- Metrics ---
+class ScanMetrics:
+    def __init__(self, profile=None, profile_path=None):
+        self.started_at = datetime.now(); self._started = time.perf_counter(); self.wall_s = None
+        self.stages = Counter(); self.latencies = {}; self.request_errors = Counter(); self.cache = Counter()
+        self.failures = Counter(); self.retries = Counter(); self.pool = Counter(); self.counts = {}; self.info = {}
+        self.profiler = ScanProfiler(profile, profile_path) if profile else None; self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Shipped back from shard worker processes; the profiler stays in the process that started it.
+        state = self.__dict__.copy(); del state['_lock']; state['profiler'] = None; return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state); self._lock = threading.Lock()
+
+    def start(self):
+        if self.profiler is not None: self.profiler.start()
+
+    def finish(self):
+        # Idempotent: called before the report is built and again when a scan generator is closed early.
+        if self.wall_s is None: self.wall_s = time.perf_counter() - self._started
+        if self.profiler is not None: self.profiler.stop()
+
+    def wrap_task(self, task): return self.profiler.wrap(task) if self.profiler is not None else task
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try: yield
+        finally:
+            with self._lock: self.stages[name] += time.perf_counter() - start
+
+    def observe(self, endpoint, seconds, reason=None):
+        with self._lock:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+            if reason is not None: self.request_errors[(endpoint, reason)] += 1
+
+    def cache_lookup(self, data_class, hits, misses):
+        with self._lock: self.cache[(data_class, 'hit')] += hits; self.cache[(data_class, 'miss')] += misses
+
+    def record_scheduler(self, scheduler):
+        with self._lock:
+            self.retries.update(scheduler.retry_reasons)
+            self.pool.update({'threads': scheduler.pool.threads, 'busy_s': scheduler.pool.busy_seconds, 'in_flight_s': scheduler.in_flight_seconds,
+                              'run_s': scheduler.run_seconds, 'max_workers': scheduler.max_workers})
+            self.pool['peak_concurrency'] = max(self.pool['peak_concurrency'], scheduler.peak_concurrency)
+            self.pool['peak_in_flight'] = max(self.pool['peak_in_flight'], scheduler.peak_in_flight)
+            self.pool['final_concurrency'] += scheduler.concurrency
+
+    def merge(self, other):
+        # Adds a shard's metrics; pool figures add up across processes, peaks take the maximum.
+        with self._lock:
+            self.stages.update(other.stages); self.request_errors.update(other.request_errors); self.cache.update(other.cache)
+            self.retries.update(other.retries)
+            for endpoint, samples in other.latencies.items(): self.latencies.setdefault(endpoint, []).extend(samples)
+            for key, value in other.pool.items():
+                self.pool[key] = max(self.pool[key], value) if key.startswith('peak_') else self.pool[key] + value
+
+    def report(self):
+        self.finish(); report = {'version': REPORT_VERSION, 'started_at': self.started_at.isoformat(timespec='seconds'), 'wall_s': round(self.wall_s, 4),
+                                 **self.info, 'counts': dict(self.counts)}
+        report['stages'] = {name: round(seconds, 4) for name, seconds in self.stages.items()}
+        report['requests'] = {}
+        for endpoint, samples in sorted(self.latencies.items()):
+            values = np.asarray(samples); errors = {reason: n for (ep, reason), n in self.request_errors.items() if ep == endpoint}
+            report['requests'][endpoint] = {'count': len(values), 'errors': errors, 'sum_s': round(float(values.sum()), 4),
+                                            'mean_s': round(float(values.mean()), 5), 'p50_s': round(float(np.percentile(values, 50)), 5),
+                                            'p95_s': round(float(np.percentile(values, 95)), 5), 'p99_s': round(float(np.percentile(values, 99)), 5),
+                                            'max_s': round(float(values.max()), 5),
+                                            'buckets': dict(zip([str(b) for b in LATENCY_BUCKETS] + ['+Inf'], np.searchsorted(np.sort(values), [*LATENCY_BUCKETS, np.inf], side='right').tolist()))}
+        report['failures'] = {reason: n for reason, n in self.failures.items() if n}
+        report['retries'] = {**{reason: n for reason, n in self.retries.items() if n}, 'total': sum(self.retries.values())}
+        cache = {}
+        for data_class in sorted({data_class for data_class, _ in self.cache}):
+            hits = self.cache[(data_class, 'hit')]; misses = self.cache[(data_class, 'miss')]
+            cache[data_class] = {'hits': hits, 'misses': misses, 'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else None}
+        if cache:
+            hits = sum(c['hits'] for c in cache.values()); lookups = hits + sum(c['misses'] for c in cache.values())
+            cache['total'] = {'hits': hits, 'misses': lookups - hits, 'hit_ratio': round(hits / lookups, 4) if lookups else None}
+        report['cache'] = cache
+        if self.pool:
+            pool = {key: round(value, 4) if isinstance(value, float) else value for key, value in self.pool.items()}
+            # Utilization: share of the thread-seconds the pool had available that were spent running tasks.
+            pool['avg_in_flight'] = round(self.pool['in_flight_s'] / self.pool['run_s'], 2) if self.pool['run_s'] else None
+            pool['utilization'] = round(min(1.0, self.pool['busy_s'] / (self.pool['threads'] * self.pool['run_s'])), 4) if self.pool['threads'] and self.pool['run_s'] else None
+            report['pool'] = pool
+        if self.profiler is not None: report['profile'] = self.profiler.result
+        return report
+
+# --- Provider Hook ---
+class InstrumentedProvider(DataProvider):
+    # Times every upstream call and classifies its errors. Placed directly above the network provider, so cache hits
+    # and rate-limiter waits are not counted as request latency.
+    def __init__(self, source, metrics=None):
+        self.source = source; self.metrics = metrics; self.name = source.name
+
+    def _timed(self, endpoint, call, *args):
+        if self.metrics is None: return call(*args)
+        start = time.perf_counter()
+        try: result = call(*args)
+        except Exception as e: self.metrics.observe(endpoint, time.perf_counter() - start, classify_error(e)); raise
+        self.metrics.observe(endpoint, time.perf_counter() - start); return result
+
+    def universe(self): return self.source.universe()
+    def info(self, symbol): return self._timed('info', self.source.info, symbol)
+    def history(self, symbol, period='1y'): return self._timed('history', self.source.history, symbol, period)
+    def financials(self, symbol): return self._timed('financials', self.source.financials, symbol)
+    def balance_sheet(self, symbol): return self._timed('balance_sheet', self.source.balance_sheet, symbol)
+    def closes(self, symbols, period='1y'): return self._timed('closes', self.source.closes, symbols, period)
+    def quotes(self, symbols): return self._timed('quotes', self.source.quotes, symbols)
+
+def instrument(provider, metrics):
+    # Points every metrics-aware layer of a provider stack at this scan's metrics; a stack without an
+    # InstrumentedProvider (offline providers, custom stacks) is wrapped at the top.
+    layers = list(provider_chain(provider))
+    for layer in layers:
+        if hasattr(layer, 'metrics'): layer.metrics = metrics
+    return provider if any(isinstance(layer, InstrumentedProvider) for layer in layers) else InstrumentedProvider(provider, metrics)
+
+# --- Export ---
+def write_report(report, path):
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'w') as f: json.dump(report, f, indent=2)
+    os.replace(tmp_path, path)
+
+def prometheus_text(report, prefix='rectifex'):
+    lines = []
+    def metric(name, kind, help_text, samples):
+        lines.extend([f"# HELP {prefix}_{name} {help_text}", f"# TYPE {prefix}_{name} {kind}"])
+        for labels, value in samples:
+            label_text = "{" + ",".join(f'{key}="{val}"' for key, val in labels.items()) + "}" if labels else ""
+            lines.append(f"{prefix}_{name}{label_text} {value}")
+    metric('scan_timestamp_seconds', 'gauge', "Start of the last scan (Unix time).", [({}, int(datetime.fromisoformat(report['started_at']).timestamp()))])
+    metric('scan_duration_seconds', 'gauge', "Wall time of the last scan.", [({}, report['wall_s'])])
+    metric('scan_tickers', 'gauge', "Tickers per scan outcome.", [({'state': key}, value) for key, value in report['counts'].items() if isinstance(value, (int, float))])
+    metric('stage_seconds', 'gauge', "Wall time per scan stage.", [({'stage': stage}, seconds) for stage, seconds in report['stages'].items()])
+    histogram = []
+    for endpoint, stats in report['requests'].items():
+        histogram += [({'endpoint': endpoint, 'le': le}, count) for le, count in stats['buckets'].items()]
+        histogram += [({'endpoint': endpoint, '__suffix': 'sum'}, stats['sum_s']), ({'endpoint': endpoint, '__suffix': 'count'}, stats['count'])]
+    lines.extend([f"# HELP {prefix}_request_seconds Upstream request latency per endpoint.", f"# TYPE {prefix}_request_seconds histogram"])
+    for labels, value in histogram:
+        suffix = labels.pop('__suffix', 'bucket'); label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+        lines.append(f"{prefix}_request_seconds_{suffix}{{{label_text}}} {value}")
+    metric('request_errors_total', 'counter', "Failed upstream requests per endpoint and cause.",
+           [({'endpoint': endpoint, 'reason': reason}, n) for endpoint, stats in report['requests'].items() for reason, n in stats['errors'].items()])
+    metric('fetch_failures_total', 'counter', "Tickers that failed after all retries, by cause.", [({'reason': reason}, n) for reason, n in report['failures'].items()])
+    metric('fetch_retries_total', 'counter', "Retried ticker fetches, by cause.", [({'reason': reason}, n) for reason, n in report['retries'].items() if reason != 'total'])
+    metric('cache_lookups_total', 'counter', "Cache lookups per data class and result.",
+           [({'data_class': data_class, 'result': result}, stats[result + 's']) for data_class, stats in report['cache'].items() if data_class != 'total' for result in ('hit', 'miss')])
+    if report['cache'].get('total', {}).get('hit_ratio') is not None:
+        metric('cache_hit_ratio', 'gauge', "Share of cache lookups served from disk.", [({}, report['cache']['total']['hit_ratio'])])
+    if 'pool' in report:
+        metric('pool_threads', 'gauge', "Worker threads started by the fetch pool.", [({}, report['pool']['threads'])])
+        if report['pool']['utilization'] is not None: metric('pool_utilization', 'gauge', "Busy share of the fetch pool's thread time.", [({}, report['pool']['utilization'])])
+    return "\n".join(lines) + "\n"
+
+def write_prometheus(report, path):
+    # Atomic replace, as the textfile collector may read the file at any time.
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'w') as f: f.write(prometheus_text(report))
+    os.replace(tmp_path, path)
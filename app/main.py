@@ -4,20 +4,44 @@
 # =============================================================================
 
 import sys
+import html
+import logging
 import pandas as pd
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QHBoxLayout, QPushButton, QComboBox, QLabel,
-                             QTableWidget, QTableWidgetItem, QProgressBar, QHeaderView,
-                             QMessageBox, QFileDialog, QDialog, QTabWidget, QTextEdit)
-from PySide6.QtCore import QThread, Signal, Qt
+                             QTableView, QLineEdit, QProgressBar, QHeaderView,
+                             QMessageBox, QFileDialog, QDialog, QTabWidget, QTextEdit, QCheckBox,
+                             QFormLayout, QDoubleSpinBox, QDialogButtonBox)
+from PySide6.QtCore import Qt, QThread, Signal
 
 import screener_engine
+import scoring_engine
+from fetch_scheduler import CancelToken
+from results_model import ResultsTableModel, ResultsProxyModel, ALL_SECTORS
+from universes import list_universes, DEFAULT_UNIVERSE
+from snapshot_store import append_snapshot
+from instrumentation import write_report
 from help_texts import HELP_TEXT_DE, HELP_TEXT_EN
 
 class ScanWorker(QThread):
-    progress = Signal(int); finished = Signal(object)
-    def __init__(self, strategy): super().__init__(); self.strategy = strategy
-    def run(self): self.finished.emit(screener_engine.run_complete_screener(self.strategy, self.progress))
+    progress = Signal(int); partial = Signal(object); finished = Signal(object)
+    def __init__(self, tickers=None, force_refresh=False): super().__init__(); self.tickers = tickers; self.force_refresh = force_refresh; self.cancel_token = CancelToken()
+    def run(self):
+        # The engine throttles partial rankings (every N rows / 500 ms), so the event loop gets a few updates per second at most.
+        # Opening the cache (e.g. an unwritable XDG_CACHE_HOME) can fail here too; finished must still fire to re-enable the GUI.
+        try:
+            for event, payload in screener_engine.stream_scan(self.progress, screener_engine.default_provider(self.force_refresh), self.tickers, cancel_token=self.cancel_token):
+                if event == 'partial': self.partial.emit(payload)
+                elif event == 'done': self.finished.emit(payload)
+        except Exception as e: logging.warning(f"Scan fehlgeschlagen: {e}"); self.finished.emit(None)
+    def cancel(self): self.cancel_token.cancel()
+
+class QuoteRefreshWorker(QThread):
+    finished = Signal(object)
+    def __init__(self, ranked_df): super().__init__(); self.ranked_df = ranked_df
+    def run(self):
+        try: self.finished.emit(screener_engine.refresh_quotes(self.ranked_df, screener_engine.default_provider()))
+        except Exception as e: logging.warning(f"Kurs-Aktualisierung fehlgeschlagen: {e}"); self.finished.emit(None)
 
 class HelpDialog(QDialog):
     def __init__(self, parent=None):
@@ -29,57 +53,149 @@ class HelpDialog(QDialog):
         self.tab_widget.addTab(en_tab, "English")
         layout = QVBoxLayout(); layout.addWidget(self.tab_widget); self.setLayout(layout)
 
+class ScanDiagnosticsDialog(QDialog):
+    # Read-only view of the ScanMetrics report of the last scan or quick refresh.
+    def __init__(self, report, parent=None):
+        super().__init__(parent); self.report = report; self.setWindowTitle("Scan Diagnostics"); self.setMinimumSize(700, 500)
+        text = QTextEdit(); text.setReadOnly(True); text.setHtml(self.report_html(report))
+        buttons = QDialogButtonBox(QDialogButtonBox.Save | QDialogButtonBox.Close); buttons.accepted.connect(self.save_report); buttons.rejected.connect(self.reject)
+        layout = QVBoxLayout(); layout.addWidget(text); layout.addWidget(buttons); self.setLayout(layout)
+
+    @staticmethod
+    def table(title, header, rows):
+        if not rows: return ""
+        cells = lambda values, tag: "".join(f"<{tag} align='left'>{html.escape(str(v))}</{tag}>" for v in values)
+        return f"<h3>{title}</h3><table cellspacing='0' cellpadding='3' border='1'><tr>{cells(header, 'th')}</tr>" + "".join(f"<tr>{cells(row, 'td')}</tr>" for row in rows) + "</table>"
+
+    def report_html(self, report):
+        counts = report.get('counts', {}); pool = report.get('pool', {})
+        overview = [("Started", report.get('started_at')), ("Wall time (s)", report.get('wall_s')), ("Provider", report.get('provider')), ("Status", report.get('status')), *[(key.capitalize(), value) for key, value in counts.items()]]
+        stages = [(name, seconds) for name, seconds in report.get('stages', {}).items()]
+        requests = [(endpoint, r['count'], sum(r['errors'].values()), r['mean_s'], r['p50_s'], r['p95_s'], r['p99_s'], r['max_s']) for endpoint, r in report.get('requests', {}).items()]
+        errors = [(endpoint, reason, n) for endpoint, r in report.get('requests', {}).items() for reason, n in r['errors'].items()]
+        cache = [(data_class, c['hits'], c['misses'], c['hit_ratio']) for data_class, c in report.get('cache', {}).items()]
+        return "".join([self.table("Overview", ["Key", "Value"], overview), self.table("Stages", ["Stage", "Seconds"], stages),
+                        self.table("Requests", ["Endpoint", "Count", "Errors", "Mean (s)", "p50 (s)", "p95 (s)", "p99 (s)", "Max (s)"], requests),
+                        self.table("Request Errors", ["Endpoint", "Cause", "Count"], errors), self.table("Cache", ["Data class", "Hits", "Misses", "Hit ratio"], cache),
+                        self.table("Worker Pool", ["Key", "Value"], list(pool.items())), self.table("Retries", ["Cause", "Count"], list(report.get('retries', {}).items())),
+                        self.table("Failed Tickers", ["Cause", "Count"], list(report.get('failures', {}).items()))])
+
+    def save_report(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Save Diagnostics", "rectifex_scan_report.json", "JSON Files (*.json)")
+        if path:
+            try: write_report(self.report, path)
+            except Exception as e: QMessageBox.critical(self, "Error", f"Error saving file:\n{e}")
+
+class CustomWeightsDialog(QDialog):
+    def __init__(self, weights, parent=None):
+        super().__init__(parent); self.setWindowTitle("Custom Strategy Weights"); form = QFormLayout(); self.spin_boxes = {}
+        for style in scoring_engine.STYLE_COLUMNS:
+            spin = QDoubleSpinBox(); spin.setRange(0.0, 1.0); spin.setSingleStep(0.05); spin.setValue(weights.get(style, 0.0))
+            self.spin_boxes[style] = spin; form.addRow(style.replace("_Score", ""), spin)
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel); buttons.accepted.connect(self.accept); buttons.rejected.connect(self.reject)
+        layout = QVBoxLayout(); layout.addLayout(form); layout.addWidget(buttons); self.setLayout(layout)
+    def weights(self):
+        return {style: spin.value() for style, spin in self.spin_boxes.items() if spin.value() > 0}
+
 class MainWindow(QMainWindow):
     def __init__(self):
-        super().__init__(); self.setWindowTitle("Rectifex - Global Stock Screener"); self.setGeometry(100, 100, 1200, 800); self.result_df = None
+        super().__init__(); self.setWindowTitle("Rectifex - Global Stock Screener"); self.setGeometry(100, 100, 1200, 800); self.result_df = None; self.ranked_df = None; self.scan_report = None
+        self.custom_weights = dict(scoring_engine.STRATEGY_DEFINITIONS["Balanced"])
         main_layout = QVBoxLayout(); top_bar_layout = QHBoxLayout(); controls_layout = QHBoxLayout()
-        self.strategy_label = QLabel("Analysis Strategy:"); self.strategy_combo = QComboBox(); self.strategy_combo.addItems(["Balanced", "High Growth", "Deep Value", "Quality Dividend"])
-        self.scan_button = QPushButton("Start Scan"); self.save_csv_button = QPushButton("Save as CSV"); self.save_csv_button.setEnabled(False); self.help_button = QPushButton("Help")
-        self.scan_button.clicked.connect(self.start_scan); self.save_csv_button.clicked.connect(self.save_as_csv); self.help_button.clicked.connect(self.show_help_dialog)
-        controls_layout.addWidget(self.strategy_label); controls_layout.addWidget(self.strategy_combo); controls_layout.addWidget(self.scan_button); controls_layout.addWidget(self.save_csv_button)
+        self.strategy_label = QLabel("Analysis Strategy:"); self.strategy_combo = QComboBox(); self.strategy_combo.addItems(["Balanced", "High Growth", "Deep Value", "Quality Dividend", "Custom"])
+        self.weights_button = QPushButton("Edit Weights..."); self.weights_button.setEnabled(False)
+        self.universe_label = QLabel("Universe:"); self.universe_combo = QComboBox(); self.universes = list_universes()
+        for name, universe in self.universes.items(): self.universe_combo.addItem(f"{universe.label} - {len(universe.tickers())} tickers", name)
+        self.universe_combo.setCurrentIndex(max(0, self.universe_combo.findData(DEFAULT_UNIVERSE)))
+        self.scan_button = QPushButton("Start Scan"); self.cancel_button = QPushButton("Cancel"); self.cancel_button.setEnabled(False); self.quick_refresh_button = QPushButton("Quick Refresh"); self.quick_refresh_button.setEnabled(False); self.save_csv_button = QPushButton("Save as CSV"); self.save_csv_button.setEnabled(False); self.diagnostics_button = QPushButton("Diagnostics"); self.diagnostics_button.setEnabled(False); self.help_button = QPushButton("Help")
+        self.quick_refresh_button.setToolTip("Fetch current prices only and recompute P/E, P/B, yield and momentum on the fundamentals of the last scan")
+        self.force_refresh_check = QCheckBox("Force refresh"); self.force_refresh_check.setToolTip("Ignore cached market data and fetch everything again")
+        self.scan_button.clicked.connect(self.start_scan); self.cancel_button.clicked.connect(self.cancel_scan); self.quick_refresh_button.clicked.connect(self.quick_refresh); self.save_csv_button.clicked.connect(self.save_as_csv); self.diagnostics_button.clicked.connect(self.show_diagnostics); self.help_button.clicked.connect(self.show_help_dialog)
+        self.strategy_combo.currentTextChanged.connect(self.strategy_changed); self.weights_button.clicked.connect(self.edit_custom_weights)
+        controls_layout.addWidget(self.universe_label); controls_layout.addWidget(self.universe_combo); controls_layout.addWidget(self.strategy_label); controls_layout.addWidget(self.strategy_combo); controls_layout.addWidget(self.weights_button); controls_layout.addWidget(self.scan_button); controls_layout.addWidget(self.cancel_button); controls_layout.addWidget(self.quick_refresh_button); controls_layout.addWidget(self.force_refresh_check); controls_layout.addWidget(self.save_csv_button); controls_layout.addWidget(self.diagnostics_button)
         top_bar_layout.addLayout(controls_layout); top_bar_layout.addStretch(); top_bar_layout.addWidget(self.help_button)
         self.progress_bar = QProgressBar(); self.progress_bar.setVisible(False)
-        self.results_table = QTableWidget(); self.results_table.setEditTriggers(QTableWidget.NoEditTriggers); self.results_table.setSortingEnabled(True); self.results_table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
-        main_layout.addLayout(top_bar_layout); main_layout.addWidget(self.progress_bar); main_layout.addWidget(self.results_table)
+        self.filter_edit = QLineEdit(); self.filter_edit.setPlaceholderText("Filter by name or ticker..."); self.filter_edit.setClearButtonEnabled(True)
+        self.sector_combo = QComboBox(); self.sector_combo.addItem(ALL_SECTORS)
+        filter_layout = QHBoxLayout(); filter_layout.addWidget(self.filter_edit); filter_layout.addWidget(self.sector_combo)
+        self.results_model = ResultsTableModel(self); self.results_proxy = ResultsProxyModel(self); self.results_proxy.setSourceModel(self.results_model)
+        self.filter_edit.textChanged.connect(self.results_proxy.set_filter_text); self.sector_combo.currentTextChanged.connect(self.results_proxy.set_sector)
+        self.results_table = QTableView(); self.results_table.setModel(self.results_proxy); self.results_table.setEditTriggers(QTableView.NoEditTriggers)
+        # No sort indicator until the user clicks a header, so enabling sorting keeps the engine's strategy-score order.
+        self.results_table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder); self.results_table.setSortingEnabled(True)
+        self.results_table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive); self.results_table.horizontalHeader().setResizeContentsPrecision(200)
+        main_layout.addLayout(top_bar_layout); main_layout.addWidget(self.progress_bar); main_layout.addLayout(filter_layout); main_layout.addWidget(self.results_table)
         central_widget = QWidget(); central_widget.setLayout(main_layout); self.setCentralWidget(central_widget)
 
     def start_scan(self):
-        self.scan_button.setEnabled(False); self.save_csv_button.setEnabled(False); self.progress_bar.setValue(0); self.progress_bar.setVisible(True); self.results_table.setRowCount(0)
-        self.worker = ScanWorker(self.strategy_combo.currentText().replace(" ", "_")); self.worker.progress.connect(self.update_progress); self.worker.finished.connect(self.scan_finished); self.worker.start()
+        self.scan_button.setEnabled(False); self.cancel_button.setEnabled(True); self.quick_refresh_button.setEnabled(False); self.save_csv_button.setEnabled(False); self.progress_bar.setRange(0, 100); self.progress_bar.setValue(0); self.progress_bar.setVisible(True); self.results_model.set_frame(pd.DataFrame()); self.ranked_df = None
+        self.results_table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        universe = self.universes.get(self.universe_combo.currentData()); self.scan_universe = universe.name if universe else DEFAULT_UNIVERSE
+        self.worker = ScanWorker(universe.tickers() if universe else None, self.force_refresh_check.isChecked()); self.worker.progress.connect(self.update_progress); self.worker.partial.connect(self.show_partial); self.worker.finished.connect(self.scan_finished); self.worker.start()
+
+    def quick_refresh(self):
+        # Two-tier refresh: one batched quote request per 200 tickers, fundamentals stay those of the last full scan.
+        if self.ranked_df is None: return
+        self.scan_button.setEnabled(False); self.quick_refresh_button.setEnabled(False); self.progress_bar.setRange(0, 0); self.progress_bar.setVisible(True)
+        self.worker = QuoteRefreshWorker(self.ranked_df); self.worker.finished.connect(self.scan_finished); self.worker.start()
+
+    def cancel_scan(self):
+        self.cancel_button.setEnabled(False); self.worker.cancel()
 
     def update_progress(self, value):
         self.progress_bar.setValue(value)
 
+    def show_partial(self, ranked_df):
+        # Provisional ranking of the tickers fetched so far; replaced by the final result when the scan finishes.
+        self.ranked_df = ranked_df; self.rescore(reset_sort=False)
+
     def scan_finished(self, results):
-        self.progress_bar.setVisible(False); self.scan_button.setEnabled(True)
+        self.progress_bar.setVisible(False); self.scan_button.setEnabled(True); self.cancel_button.setEnabled(False); self.quick_refresh_button.setEnabled(self.ranked_df is not None)
         if not results:
              QMessageBox.warning(self, "Error", "An unexpected error occurred."); return
-        df, summary_text = results
+        ranked_df, summary_text, self.scan_report = results; self.diagnostics_button.setEnabled(True)
         QMessageBox.information(self, "Scan Finished", summary_text.replace("<br>", "\n").replace("<hr>", "\n------------------------------------\n").replace("<b>", "").replace("</b>", ""))
-        if df.empty: return
-        self.result_df = df
-        self.save_csv_button.setEnabled(True)
-        self.populate_table(df)
+        if ranked_df.empty: self.ranked_df = None; self.results_model.set_frame(pd.DataFrame()); return
+        self.ranked_df = ranked_df; append_snapshot(scoring_engine.score_frame(ranked_df), self.scan_universe)
+        self.save_csv_button.setEnabled(True); self.quick_refresh_button.setEnabled(True)
+        self.rescore()
+
+    def current_strategy(self):
+        return self.strategy_combo.currentText().replace(" ", "_")
+
+    def strategy_changed(self, text):
+        self.weights_button.setEnabled(text == "Custom")
+        if text == "Custom" and self.edit_custom_weights(): return
+        self.rescore()
+
+    def edit_custom_weights(self):
+        dialog = CustomWeightsDialog(self.custom_weights, self)
+        if not dialog.exec() or not dialog.weights(): return False
+        self.custom_weights = dialog.weights(); self.rescore(); return True
+
+    def rescore(self, reset_sort=True):
+        # Re-scoring works on the ranked frame from the last scan only, no data is fetched again.
+        if self.ranked_df is None: return
+        scored_df = scoring_engine.score_frame(self.ranked_df, {"Custom": self.custom_weights})
+        self.result_df = scoring_engine.display_frame(scored_df, self.current_strategy())
+        # A new result or strategy is shown in its strategy-score order, dropping a user's column sort; provisional
+        # rankings during a scan (reset_sort=False) keep whatever column the user sorted by.
+        if reset_sort: self.results_table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.populate_table(self.result_df)
 
     def populate_table(self, df):
-        self.results_table.setSortingEnabled(False)
-        df_display = df.rename(columns={'MarketCapUSD': 'MarketCap (USD)'})
-        self.results_table.setRowCount(len(df_display)); self.results_table.setColumnCount(len(df_display.columns)); self.results_table.setHorizontalHeaderLabels(df_display.columns)
-        for r_idx, (index, row) in enumerate(df_display.iterrows()):
-            for c_idx, col_name in enumerate(df_display.columns):
-                original_col_name = 'MarketCapUSD' if col_name == 'MarketCap (USD)' else col_name
-                raw_value = df.iloc[r_idx][original_col_name]
-                item = QTableWidgetItem()
-                if isinstance(raw_value, (int, float)) and not pd.isna(raw_value): item.setData(Qt.EditRole, raw_value)
-                display_text = "N/A"
-                if not pd.isna(raw_value):
-                    if col_name == 'MarketCap (USD)': display_text = f'${raw_value/1e9:,.0f}B'
-                    elif '_Score' in col_name or "Value" in col_name or "Growth" in col_name or col_name in ["Balanced", "PE", "ROE_Avg3Y", "RevGrowth3YCAGR"]: display_text = f'{raw_value:,.1f}'
-                    elif col_name == 'PB': display_text = f'{raw_value:,.2f}'
-                    elif col_name == 'DivYield': display_text = f'{raw_value:,.2f}%'
-                    else: display_text = str(raw_value)
-                item.setText(display_text); self.results_table.setItem(r_idx, c_idx, item)
-        self.results_table.resizeColumnsToContents(); self.results_table.setSortingEnabled(True)
+        # The model only keeps the column arrays; cells are formatted lazily for the visible rows.
+        first_fill = self.results_model.n_rows == 0
+        self.results_model.set_frame(df); self.update_sector_filter(df)
+        if first_fill: self.results_table.resizeColumnsToContents()
+
+    def update_sector_filter(self, df):
+        sectors = sorted(df['Sector'].dropna().unique()) if 'Sector' in df.columns else []
+        if sectors == [self.sector_combo.itemText(i) for i in range(1, self.sector_combo.count())]: return
+        current = self.sector_combo.currentText(); self.sector_combo.blockSignals(True)
+        self.sector_combo.clear(); self.sector_combo.addItems([ALL_SECTORS] + sectors)
+        self.sector_combo.setCurrentText(current if current in sectors else ALL_SECTORS); self.sector_combo.blockSignals(False)
+        self.results_proxy.set_sector(self.sector_combo.currentText())
 
     def save_as_csv(self):
         if self.result_df is None: return
@@ -91,6 +207,10 @@ class MainWindow(QMainWindow):
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Error saving file:\n{e}")
 
+    def show_diagnostics(self):
+        if self.scan_report is None: return
+        dialog = ScanDiagnosticsDialog(self.scan_report, self); dialog.exec()
+
     def show_help_dialog(self):
         dialog = HelpDialog(self); dialog.exec()
 
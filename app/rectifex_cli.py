@@ -0,0 +1,226 @@
+# =============================================================================
+# Rectifex - Command Line
+# Headless scans for servers and cron jobs. pandas, the scan engine and
+# yfinance are only imported once the arguments are parsed, so --help and
+# --list-universes start instantly and a cache-only re-score never loads the
+# network stack.
+#
+#   rectifex --universe global_top --strategy Deep_Value -o picks.parquet
+#   rectifex --provider cache --strategy High_Growth -o growth.csv
+#   rectifex --progress json --max-failure-ratio 0.2 -o nightly.arrow
+#   rectifex --quotes-only -o intraday.csv             # prices only, fundamentals from the last scan
+#   rectifex --report scan.json --prometheus /var/lib/node_exporter/rectifex.prom -o nightly.csv
+#
+# Exit codes: 0 ok, 1 scan failed or cancelled, 2 usage / output error,
+# 3 failure threshold exceeded (the output file is left untouched).
+# =============================================================================
+
+import argparse
+import importlib.util
+import json
+import os
+import re
+import signal
+import sys
+import time
+
+EXIT_OK = 0
+EXIT_SCAN_FAILED = 1
+EXIT_USAGE = 2
+EXIT_THRESHOLD = 3
+PROVIDERS = ('yfinance', 'cache', 'synthetic', 'replay')
+DEFAULT_MAX_SNAPSHOT_AGE_HOURS = 24.0
+FORMATS = {'.csv': 'csv', '.parquet': 'parquet', '.pq': 'parquet', '.arrow': 'arrow', '.feather': 'arrow', '.ipc': 'arrow'}
+
+class CliError(Exception):
+    def __init__(self, message, exit_code=EXIT_USAGE):
+        super().__init__(message); self.exit_code = exit_code
+
+# --- Progress Reporting ---
+class Progress:
+    # Drop-in for the GUI's progress signal (emit(percent)); everything goes to stderr so stdout can carry the CSV.
+    def __init__(self, mode, stream=None):
+        self.mode = mode; self.stream = stream or sys.stderr; self.started = time.monotonic(); self.percent = -1
+
+    def event(self, name, **fields):
+        if self.mode == 'json':
+            self.stream.write(json.dumps({'event': name, 'elapsed_s': round(time.monotonic() - self.started, 3), **fields}) + "\n")
+        elif self.mode == 'text' and name != 'progress':
+            self.stream.write(f"{name}: " + ", ".join(f"{key}={value}" for key, value in fields.items()) + "\n")
+        self.stream.flush()
+
+    def emit(self, percent):
+        if percent == self.percent: return
+        self.percent = percent; self.event('progress', percent=percent)
+        if self.mode == 'text' and self.stream.isatty(): self.stream.write(f"\rScanning... {percent}%"); self.stream.flush()
+
+def summary_text(summary):
+    return re.sub(r'<[^>]+>', '', summary.replace('<br>', '\n').replace('<hr>', '\n')).strip()
+
+# --- Arguments ---
+def build_parser():
+    parser = argparse.ArgumentParser(prog='rectifex', description="Run a Rectifex scan without the GUI and write the ranked table.",
+                                     epilog="Exit codes: 0 ok, 1 scan failed or cancelled, 2 usage/output error, 3 failure threshold exceeded.")
+    parser.add_argument('-u', '--universe', help="universe name or path to a JSON/CSV/TXT file (default: the provider's own universe, else global_top)")
+    parser.add_argument('-s', '--strategy', default='Balanced', help="strategy to sort by: Balanced, Deep_Value, High_Growth, Quality_Dividend (default: Balanced)")
+    parser.add_argument('-p', '--provider', choices=PROVIDERS, default='yfinance',
+                        help="yfinance: live data through the local cache; cache: cached payloads only, ignoring their age, no network; "
+                             "synthetic / replay: offline test data (default: yfinance)")
+    parser.add_argument('--replay-dir', metavar='DIR', help="capture directory for --provider replay")
+    parser.add_argument('--synthetic-size', type=int, default=200, metavar='N', help="tickers for --provider synthetic (default: 200)")
+    parser.add_argument('--force-refresh', action='store_true', help="ignore cached payloads and download everything again")
+    parser.add_argument('--no-cache', action='store_true', help="do not read or write the local cache")
+    parser.add_argument('--processes', type=int, metavar='N', help="worker processes (default: automatic for universes of 2,000+ tickers)")
+    parser.add_argument('-o', '--output', default='-', metavar='PATH', help="output file; '-' writes CSV to stdout (default)")
+    parser.add_argument('-f', '--format', choices=sorted(set(FORMATS.values())), help="csv, parquet or arrow (IPC file); default: from the file extension")
+    parser.add_argument('--all-columns', action='store_true', help="write every metric, rank and strategy score instead of the display columns")
+    parser.add_argument('--progress', choices=('text', 'json', 'none'), default='text', help="progress on stderr; json writes one event object per line (default: text)")
+    parser.add_argument('--max-failure-ratio', type=float, metavar='R', help="exit 3 if more than this fraction of the universe failed to fetch")
+    parser.add_argument('--min-rows', type=int, metavar='N', help="exit 3 if fewer than N stocks remain after filtering")
+    parser.add_argument('--quotes-only', action='store_true',
+                        help="fast refresh: fetch current prices only and recompute P/E, P/B, yield, market cap and momentum on the latest snapshot of the universe")
+    parser.add_argument('--max-snapshot-age', type=float, default=DEFAULT_MAX_SNAPSHOT_AGE_HOURS, metavar='HOURS',
+                        help="with --quotes-only: refuse snapshots older than this, since 6-month momentum is measured from the snapshot's scan date; 0 disables the check (default: 24)")
+    parser.add_argument('--no-snapshot', action='store_true', help="do not append this scan to the snapshot history (yfinance scans are appended by default)")
+    parser.add_argument('--snapshot-dir', metavar='DIR', help="snapshot store location; also appends scans from the offline providers")
+    parser.add_argument('--report', metavar='PATH', help="write the scan report (stage timings, request latencies, errors, cache and pool statistics) as JSON")
+    parser.add_argument('--prometheus', metavar='PATH', help="write the scan report in the Prometheus text format, e.g. for the node_exporter textfile collector")
+    parser.add_argument('--profile', choices=('cprofile', 'tracemalloc'), help="profile the scan; the top entries are added to the report (cprofile covers the parent process only when sharding)")
+    parser.add_argument('--profile-out', metavar='PATH', help="with --profile cprofile: also dump the merged pstats file (open with snakeviz or python -m pstats)")
+    parser.add_argument('--list-universes', action='store_true', help="list the available universes and exit")
+    return parser
+
+def output_format(args):
+    fmt = args.format or ('csv' if args.output == '-' else FORMATS.get(os.path.splitext(args.output)[1].lower()))
+    if fmt is None: raise CliError(f"Cannot infer the output format of '{args.output}'; pass --format csv|parquet|arrow.")
+    if fmt != 'csv' and args.output == '-': raise CliError(f"{fmt} output needs a file path (-o).")
+    if fmt != 'csv' and importlib.util.find_spec('pyarrow') is None:
+        raise CliError(f"{fmt} output requires the optional pyarrow package (pip install pyarrow); use --format csv without it.")
+    return fmt
+
+def list_universes():
+    from universes import list_universes as available
+    for name, universe in available().items(): print(f"{name:<24}{len(universe.tickers()):>7} tickers  {universe.label} [{universe.source}]")
+
+# --- Scan ---
+def make_provider(args):
+    from data_providers import YFinanceProvider, ReplayProvider, SyntheticProvider, OfflineProvider
+    from cache_store import CachedProvider
+    from fetch_scheduler import RateLimitedProvider
+    from instrumentation import InstrumentedProvider
+    if args.provider == 'synthetic': return SyntheticProvider(args.synthetic_size)
+    if args.provider == 'replay':
+        if not args.replay_dir or not os.path.isdir(args.replay_dir): raise CliError("--provider replay needs an existing --replay-dir.")
+        return ReplayProvider(args.replay_dir)
+    if args.provider == 'cache': return CachedProvider(OfflineProvider(), ignore_ttl=True)
+    # Instrumented below the rate limiter, so request latencies do not include the time spent waiting for a token.
+    if args.no_cache: return RateLimitedProvider(InstrumentedProvider(YFinanceProvider()))
+    return CachedProvider(RateLimitedProvider(InstrumentedProvider(YFinanceProvider())), force_refresh=args.force_refresh)
+
+def resolve_tickers(args):
+    if args.universe is None: return None
+    from universes import load_universe
+    try: tickers = load_universe(args.universe)
+    except KeyError as e: raise CliError(e.args[0])
+    except (OSError, ValueError) as e: raise CliError(f"Cannot read universe '{args.universe}': {e}")
+    if not tickers: raise CliError(f"Universe '{args.universe}' is empty.")
+    return tickers
+
+def check_thresholds(args, counts):
+    if args.max_failure_ratio is not None and counts['universe'] and counts['failed'] / counts['universe'] > args.max_failure_ratio:
+        return f"{counts['failed']} of {counts['universe']} tickers failed ({counts['failed'] / counts['universe']:.1%} > {args.max_failure_ratio:.1%})"
+    if args.min_rows is not None and counts['final'] < args.min_rows:
+        return f"only {counts['final']} stocks after filtering (minimum {args.min_rows})"
+    return None
+
+def write_reports(args, report):
+    from instrumentation import write_report, write_prometheus
+    try:
+        if args.report: write_report(report, args.report)
+        if args.prometheus: write_prometheus(report, args.prometheus)
+    except OSError as e: raise CliError(f"Cannot write scan report: {e}")
+
+def write_output(df, path, fmt):
+    # Files are written next to the target and renamed into place, so a reader never sees a half-written table.
+    if path == '-': df.to_csv(sys.stdout, index=False); return
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    try:
+        if fmt == 'csv': df.to_csv(tmp_path, index=False)
+        elif fmt == 'parquet': df.to_parquet(tmp_path, index=False, engine='pyarrow')
+        else:
+            import pyarrow.feather
+            pyarrow.feather.write_feather(df.reset_index(drop=True), tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+
+def snapshot_universe(args, provider):
+    from universes import DEFAULT_UNIVERSE
+    if args.universe: return os.path.splitext(os.path.basename(args.universe))[0]
+    return provider.name if provider.universe() else DEFAULT_UNIVERSE
+
+def full_scan(args, progress, provider, tickers, metrics):
+    import screener_engine
+    from fetch_scheduler import CancelToken
+    cancel_token = CancelToken()
+    # SIGINT / SIGTERM (e.g. a cron timeout) cancel the scan cleanly instead of killing the worker threads mid-write.
+    for signum in (signal.SIGINT, signal.SIGTERM): signal.signal(signum, lambda *_: cancel_token.cancel())
+    for event, payload in screener_engine.stream_scan(progress, provider, tickers, cancel_token, batch_rows=float('inf'), interval=float('inf'), processes=args.processes, metrics=metrics):
+        if event == 'done': ranked_df, summary, report = payload
+    if progress.mode == 'text' and progress.stream.isatty(): progress.stream.write("\n")
+    return ranked_df, summary, report
+
+def quote_refresh(args, provider, store, metrics):
+    # Latest snapshot of the universe + one batched quote request per 200 tickers; no statement data is fetched.
+    import pandas as pd
+    import screener_engine
+    universe = snapshot_universe(args, provider); snapshots = store.snapshots(universe=universe)
+    if not snapshots: raise CliError(f"No snapshot of universe '{universe}' to refresh; run a full scan first.", EXIT_SCAN_FAILED)
+    # Momentum is re-based on the close 126 trading days before the snapshot's scan; an old snapshot silently stretches it.
+    age_hours = (pd.Timestamp.now() - snapshots[-1].taken_at) / pd.Timedelta(hours=1)
+    if args.max_snapshot_age > 0 and age_hours > args.max_snapshot_age:
+        raise CliError(f"Latest snapshot of universe '{universe}' is {age_hours:.0f}h old (limit {args.max_snapshot_age:g}h); run a full scan or raise --max-snapshot-age.", EXIT_SCAN_FAILED)
+    metrics.info['base_snapshot'] = str(snapshots[-1].taken_at)
+    return screener_engine.refresh_quotes(store.load(snapshots[-1]), provider, metrics)
+
+def run(args, progress):
+    fmt = output_format(args); tickers = resolve_tickers(args)
+    from scoring_engine import STRATEGY_DEFINITIONS, score_frame, display_frame
+    from snapshot_store import SnapshotStore, append_snapshot
+    if args.strategy not in STRATEGY_DEFINITIONS: raise CliError(f"Unknown strategy '{args.strategy}'. Available: {', '.join(STRATEGY_DEFINITIONS)}")
+    if args.quotes_only and args.provider == 'cache': raise CliError("--quotes-only needs live prices; it cannot be combined with --provider cache.")
+    if args.profile_out and args.profile != 'cprofile': raise CliError("--profile-out needs --profile cprofile.")
+    from instrumentation import ScanMetrics
+    provider = make_provider(args); store = SnapshotStore(args.snapshot_dir); metrics = ScanMetrics(args.profile, args.profile_out)
+    progress.event('start', provider=provider.name, universe=args.universe or 'default', strategy=args.strategy, output=args.output, format=fmt, quotes_only=args.quotes_only)
+    ranked_df, summary, report = quote_refresh(args, provider, store, metrics) if args.quotes_only else full_scan(args, progress, provider, tickers, metrics)
+    # Reports are written for failed and cancelled scans too; those are the runs worth looking at.
+    write_reports(args, report)
+    progress.event('stats', **report['counts'], failures=report['failures'], retries=report['retries']['total'], wall_s=report['wall_s'], stages=report['stages'])
+    if report.get('status') == 'cancelled': raise CliError("Scan cancelled.", EXIT_SCAN_FAILED)
+    if progress.mode == 'text': progress.stream.write(summary_text(summary) + "\n")
+    if ranked_df.empty: raise CliError("Scan failed: no ticker could be processed.", EXIT_SCAN_FAILED)
+    breach = check_thresholds(args, report['counts'])
+    if breach: raise CliError(f"Failure threshold exceeded: {breach}; output not written.", EXIT_THRESHOLD)
+    scored_df = score_frame(ranked_df)
+    final_df = scored_df.sort_values(by=args.strategy, ascending=False) if args.all_columns else display_frame(scored_df, args.strategy)
+    try: write_output(final_df, args.output, fmt)
+    except (OSError, ImportError, ValueError) as e: raise CliError(f"Cannot write '{args.output}': {e}")
+    snapshot = None
+    if not args.no_snapshot and (args.provider == 'yfinance' or args.snapshot_dir):
+        snapshot = append_snapshot(scored_df, snapshot_universe(args, provider), store)
+    progress.event('done', rows=len(final_df), output=args.output, format=fmt, snapshot=snapshot)
+    return EXIT_OK
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.list_universes: list_universes(); return EXIT_OK
+    progress = Progress(args.progress)
+    try: return run(args, progress)
+    except CliError as e:
+        if progress.mode == 'json': progress.event('error', message=str(e), exit_code=e.exit_code)
+        else: print(f"rectifex: {e}", file=sys.stderr)
+        return e.exit_code
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+# =============================================================================
+# Rectifex - Results Table Model
+# Virtualized model/view backing for the results table: the model keeps one
+# NumPy array per column and formats a cell only when the view asks for it;
+# the proxy sorts with numpy argsort and filters by text and sector.
+# =============================================================================
+
+import numpy as np
+import pandas as pd
+from PySide6.QtCore import Qt, QAbstractTableModel, QAbstractProxyModel, QModelIndex
+
+HEADER_LABELS = {'MarketCapUSD': 'MarketCap (USD)'}
+ONE_DECIMAL_COLUMNS = ["Balanced", "Custom", "PE", "ROE_Avg3Y", "RevGrowth3YCAGR"]
+ALL_SECTORS = "All Sectors"
+
+def column_formatter(col_name):
+    if col_name == 'MarketCapUSD': return lambda v: f'${v/1e9:,.0f}B'
+    if '_Score' in col_name or "Value" in col_name or "Growth" in col_name or col_name in ONE_DECIMAL_COLUMNS: return lambda v: f'{v:,.1f}'
+    if col_name == 'PB': return lambda v: f'{v:,.2f}'
+    if col_name == 'DivYield': return lambda v: f'{v:,.2f}%'
+    return str
+
+class ResultsTableModel(QAbstractTableModel):
+    def __init__(self, parent=None):
+        super().__init__(parent); self.columns = []; self.arrays = []; self.numeric = []; self.formatters = []; self.n_rows = 0
+
+    def set_frame(self, df):
+        self.beginResetModel()
+        self.columns = list(df.columns); self.n_rows = len(df)
+        self.numeric = [pd.api.types.is_numeric_dtype(df[col]) for col in self.columns]
+        self.arrays = [df[col].to_numpy(dtype=float) if is_num else df[col].to_numpy(dtype=object) for col, is_num in zip(self.columns, self.numeric)]
+        self.formatters = [column_formatter(col) for col in self.columns]
+        self.endResetModel()
+
+    def column_array(self, name):
+        return self.arrays[self.columns.index(name)] if name in self.columns else None
+
+    def rowCount(self, parent=QModelIndex()): return 0 if parent.isValid() else self.n_rows
+    def columnCount(self, parent=QModelIndex()): return 0 if parent.isValid() else len(self.columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid(): return None
+        col = index.column(); value = self.arrays[col][index.row()]
+        if role == Qt.DisplayRole: return "N/A" if pd.isna(value) else self.formatters[col](value)
+        if role == Qt.EditRole: return None if pd.isna(value) else (float(value) if self.numeric[col] else str(value))
+        if role == Qt.TextAlignmentRole and self.numeric[col]: return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole: return None
+        if orientation == Qt.Horizontal: return HEADER_LABELS.get(self.columns[section], self.columns[section])
+        return str(section + 1)
+
+class ResultsProxyModel(QAbstractProxyModel):
+    # View order is a single row index array (sorted, then filtered); the inverse array answers mapFromSource in O(1).
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.sort_column = -1; self.sort_order = Qt.AscendingOrder; self.filter_text = ""; self.sector = ALL_SECTORS
+        self.rows = np.zeros(0, dtype=np.int64); self.inverse = np.zeros(0, dtype=np.int64)
+
+    def setSourceModel(self, model):
+        self.beginResetModel(); super().setSourceModel(model)
+        model.modelAboutToBeReset.connect(self.beginResetModel); model.modelReset.connect(self._source_reset)
+        self._rebuild(); self.endResetModel()
+
+    def _source_reset(self):
+        self._rebuild(); self.endResetModel()
+
+    def _sort_keys(self):
+        model = self.sourceModel(); n = model.n_rows
+        if self.sort_column < 0 or self.sort_column >= len(model.columns): return np.arange(n)
+        values = model.arrays[self.sort_column]
+        if model.numeric[self.sort_column]:
+            # NaN sorts last in either direction, ties keep the engine's order (stable sort).
+            return np.argsort(values if self.sort_order == Qt.AscendingOrder else -values, kind='stable')
+        order = np.argsort(pd.Series(values).fillna("").astype(str).str.lower().to_numpy(), kind='stable')
+        return order if self.sort_order == Qt.AscendingOrder else order[::-1]
+
+    def _filter_mask(self):
+        model = self.sourceModel(); mask = np.ones(model.n_rows, dtype=bool)
+        if self.filter_text:
+            text = self.filter_text.lower()
+            haystack = pd.Series(model.column_array('Name') if 'Name' in model.columns else [""] * model.n_rows).fillna("").astype(str)
+            if 'Ticker' in model.columns: haystack = haystack + "\t" + pd.Series(model.column_array('Ticker')).fillna("").astype(str)
+            mask &= haystack.str.lower().str.contains(text, regex=False).to_numpy()
+        if self.sector != ALL_SECTORS and 'Sector' in model.columns: mask &= model.column_array('Sector') == self.sector
+        return mask
+
+    def _rebuild(self):
+        model = self.sourceModel()
+        if model is None: return
+        order = self._sort_keys(); self.rows = order[self._filter_mask()[order]]
+        self.inverse = np.full(model.n_rows, -1, dtype=np.int64); self.inverse[self.rows] = np.arange(len(self.rows))
+
+    def _refresh(self):
+        self.layoutAboutToBeChanged.emit(); self._rebuild(); self.layoutChanged.emit()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sort_column = column; self.sort_order = order; self._refresh()
+
+    def set_filter_text(self, text):
+        self.beginResetModel(); self.filter_text = text.strip(); self._rebuild(); self.endResetModel()
+
+    def set_sector(self, sector):
+        self.beginResetModel(); self.sector = sector or ALL_SECTORS; self._rebuild(); self.endResetModel()
+
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or not (0 <= row < len(self.rows)) or not (0 <= column < self.columnCount()): return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=QModelIndex()): return QModelIndex()
+    def rowCount(self, parent=QModelIndex()): return 0 if parent.isValid() else len(self.rows)
+    def columnCount(self, parent=QModelIndex()): return 0 if parent.isValid() or self.sourceModel() is None else self.sourceModel().columnCount()
+
+    def mapToSource(self, proxy_index):
+        if not proxy_index.isValid() or proxy_index.row() >= len(self.rows): return QModelIndex()
+        return self.sourceModel().index(int(self.rows[proxy_index.row()]), proxy_index.column())
+
+    def mapFromSource(self, source_index):
+        if not source_index.isValid() or self.inverse[source_index.row()] < 0: return QModelIndex()
+        return self.index(int(self.inverse[source_index.row()]), source_index.column())
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Vertical: return str(section + 1) if role == Qt.DisplayRole else None
+        return self.sourceModel().headerData(section, orientation, role)
@@ -0,0 +1,74 @@
+# =============================================================================
+# Rectifex - Scoring Engine
+# Cross-sectional ranking and strategy scoring on an already-fetched metrics
+# frame. All style scores and all strategies come out of two matrix products,
+# so switching strategies or weights never touches the network. The array
+# functions work along the last axis, so the backtest applies the same logic to
+# a whole dates x metrics x tickers cube at once.
+# =============================================================================
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+METRICS_TO_RANK = {'ROE_Avg3Y': False, 'PE': True, 'PB': True, 'RevGrowth3YCAGR': False, 'Momentum6M': False, 'DivYield': False, 'Volatility': True, 'DebtEquity': True}
+BASE_SCORES = {'Quality_Score': {'ROE_Avg3Y': 1.0},'Value_Score': {'PE': 0.5, 'PB': 0.5},'Growth_Score': {'RevGrowth3YCAGR': 1.0},'Momentum_Score': {'Momentum6M': 1.0},'Yield_Score': {'DivYield': 1.0},'Safety_Score': {'Volatility': 0.5, 'DebtEquity': 0.5}}
+STRATEGY_DEFINITIONS = {"Balanced": {'Quality_Score': 0.30, 'Value_Score': 0.25, 'Growth_Score': 0.20, 'Momentum_Score': 0.10, 'Yield_Score': 0.10, 'Safety_Score': 0.05},"Deep_Value": {'Value_Score': 0.70, 'Safety_Score': 0.20, 'Yield_Score': 0.10},"High_Growth": {'Growth_Score': 0.60, 'Quality_Score': 0.30, 'Momentum_Score': 0.10},"Quality_Dividend": {'Yield_Score': 0.50, 'Quality_Score': 0.30, 'Safety_Score': 0.20}}
+STYLE_COLUMNS = list(BASE_SCORES)
+WINSOR_QUANTILES = (0.02, 0.98)
+DISPLAY_COLUMNS = ['Name','Ticker','Country','Sector','Quality_Score','Value_Score','Growth_Score','Momentum_Score','Yield_Score','Safety_Score','MarketCapUSD','PE','PB','ROE_Avg3Y','RevGrowth3YCAGR','DivYield']
+
+def weight_matrix(definitions, rows):
+    # len(rows) x len(definitions) matrix; unknown keys in a definition are ignored.
+    matrix = np.zeros((len(rows), len(definitions))); row_index = {row: i for i, row in enumerate(rows)}
+    for j, weights in enumerate(definitions.values()):
+        for key, weight in weights.items():
+            if key in row_index: matrix[row_index[key], j] = weight
+    return matrix
+
+def winsorize(values, quantiles=WINSOR_QUANTILES):
+    # Clips along the last axis at the given quantiles (linear interpolation, NaNs ignored, like Series.quantile).
+    values = np.asarray(values, dtype=float)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning); lower, upper = np.nanquantile(values, quantiles, axis=-1, keepdims=True)
+    return np.clip(values, lower, upper)
+
+def percentile_ranks(values, ascending=True):
+    # Series.rank(pct=True) * 100 along the last axis: ties share their average rank, NaN stays NaN.
+    values = np.asarray(values, dtype=float); keys = values if ascending else -values; n = values.shape[-1]
+    order = np.argsort(keys, axis=-1, kind='stable'); ordered = np.take_along_axis(keys, order, axis=-1); position = np.arange(n)
+    starts = np.ones(values.shape, dtype=bool); starts[..., 1:] = ordered[..., 1:] != ordered[..., :-1]
+    ends = np.ones(values.shape, dtype=bool); ends[..., :-1] = starts[..., 1:]
+    first = np.maximum.accumulate(np.where(starts, position, 0), axis=-1)
+    last = np.minimum.accumulate(np.where(ends, position, n - 1)[..., ::-1], axis=-1)[..., ::-1]
+    ranks = np.empty(values.shape); count = (~np.isnan(values)).sum(axis=-1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'): np.put_along_axis(ranks, order, ((first + last) / 2 + 1) / count * 100, axis=-1)
+    return np.where(np.isnan(values), np.nan, ranks)
+
+def rank_metrics(df, columns=None):
+    # Ranks the winsorized values; the metric columns themselves keep their raw values, so ranking a frame again
+    # (quote refresh, snapshots) always starts from the fetched data. columns limits the pass to metrics that changed.
+    for col in columns or METRICS_TO_RANK:
+        if col in df.columns: df[f'Rank_{col}'] = percentile_ranks(winsorize(df[col].to_numpy(dtype=float)), METRICS_TO_RANK[col])
+    return df
+
+def score_matrix(ranks, strategies):
+    # ranks: (..., len(METRICS_TO_RANK)) percentiles in METRICS_TO_RANK order, NaN counts as neutral (50).
+    # Returns the style scores (..., len(STYLE_COLUMNS)) and strategy scores (..., len(strategies)).
+    styles = 100 - np.where(np.isnan(ranks), 50.0, ranks) @ weight_matrix(BASE_SCORES, list(METRICS_TO_RANK))
+    return styles, styles @ weight_matrix(strategies, STYLE_COLUMNS)
+
+def score_frame(df, strategies=None):
+    # Adds every style score and every strategy (built-in plus user-defined) to a ranked frame in one pass.
+    strategies = {**STRATEGY_DEFINITIONS, **(strategies or {})}; metrics = list(METRICS_TO_RANK)
+    # A missing rank column contributes nothing; a missing value inside a present column counts as neutral (50).
+    ranks = np.column_stack([df[f'Rank_{m}'].to_numpy(dtype=float) if f'Rank_{m}' in df.columns else np.zeros(len(df)) for m in metrics]) if len(df) else np.zeros((0, len(metrics)))
+    styles, scores = score_matrix(ranks, strategies)
+    scored = df.drop(columns=[col for col in [*STYLE_COLUMNS, *strategies] if col in df.columns])
+    return pd.concat([scored, pd.DataFrame(np.round(np.hstack([styles, scores]), 1), index=df.index, columns=[*STYLE_COLUMNS, *strategies])], axis=1)
+
+def display_frame(scored_df, strategy):
+    columns = DISPLAY_COLUMNS[:4] + [strategy] + DISPLAY_COLUMNS[4:]
+    final_df = scored_df.sort_values(by=strategy, ascending=False)
+    return final_df[[col for col in columns if col in final_df.columns]]
@@ -3,11 +3,19 @@
 # VERSION 57.0: "Gold Standard Ticker List"
 # =============================================================================
 
-import yfinance as yf
 import pandas as pd
 import numpy as np
+import time
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import Counter
+
+from data_providers import YFinanceProvider
+from cache_store import CachedProvider
+from fetch_scheduler import FetchScheduler, FetchError, RateLimitedProvider, CancelToken, FAILURE_LABELS_DE
+from scoring_engine import rank_metrics, score_frame, display_frame
+from instrumentation import ScanMetrics, InstrumentedProvider, instrument
+from universes import load_universe, DEFAULT_UNIVERSE
+import sharding
 
 # --- Global Configuration ---
 APPROX_RATES = {
@@ -15,128 +23,261 @@ APPROX_RATES = {
     'AUD': 0.66, 'HKD': 0.13, 'BRL': 0.18, 'DKK': 0.14, 'SEK': 0.096,
     'NOK': 0.094, 'INR': 0.012, 'KRW': 0.00072, 'CNY': 0.14, 'GBp': 0.0127
 }
+MAX_WORKERS = 8
+TICKER_DEADLINE = 20.0
+PRICE_DEADLINE = 180.0
+PARTIAL_BATCH_ROWS = 100
+PARTIAL_INTERVAL = 0.5
+CATEGORICAL_COLUMNS = ['Sector', 'Country', 'Currency']
+FULL_PRECISION_COLUMNS = ['MarketCap', 'MarketCapUSD', 'Shares']
+STATEMENT_LINES = {'financials': ['Total Revenue', 'Net Income'], 'balance_sheet': ['Stockholders Equity', 'Total Liab']}
 
 # --- Data Acquisition & Auxiliary Functions ---
 def get_global_top_tickers():
-    blue_chip_us = [
-        'AAPL', 'ABT', 'ABBV', 'ACN', 'ADBE', 'ADI', 'ADP', 'AMAT', 'AMD', 'AMGN', 'AMT', 'AMZN', 'AVGO', 'AXP',
-        'BA', 'BAC', 'BLK', 'BMY', 'BRK-B', 'C', 'CAT', 'CMCSA', 'COP', 'COST', 'CRM', 'CSCO', 'CVS',
-        'CVX', 'DE', 'DIS', 'DOW', 'DUK', 'GE', 'GILD', 'GOOGL', 'GS', 'HD', 'HON', 'IBM', 'INTC', 'INTU', 'ISRG',
-        'JNJ', 'JPM', 'KO', 'LIN', 'LLY', 'LMT', 'LOW', 'MA', 'MCD', 'MDT', 'META', 'MMM', 'MO', 'MRK',
-        'MS', 'MSFT', 'NEE', 'NFLX', 'NKE', 'NOW', 'NVDA', 'ORCL', 'PEP', 'PFE', 'PG', 'PM', 'PYPL', 'QCOM',
-        'RTX', 'SBUX', 'SO', 'T', 'TMO', 'TSLA', 'TXN', 'UNH', 'UNP', 'UPS', 'V', 'VZ', 'WFC', 'WMT', 'XOM'
-    ]
-    blue_chip_eu = [
-        'ABI.BR', 'ABBN.SW', 'ADS.DE', 'ADYEN.AS', 'AI.PA', 'AIR.PA', 'ALV.DE', 'ASML.AS', 'AZN',
-        'BAS.DE', 'BAYN.DE', 'BMW.DE', 'BNP.PA', 'BP', 'DGE.L', 'DTE.DE', 'ENEL.MI',
-        'ENI.MI', 'EQNR.OL', 'GSK', 'HSBC', 'IBE.MC', 'INGA.AS', 'ISP.MI', 'ITX.MC',
-        'LVMH.PA', 'MBG.DE', 'MC.PA', 'MUV2.DE', 'NESN.SW', 'NOVN.SW', 'NOVO-B.CO', 'OR.PA',
-        'RIO', 'ROG.SW', 'RWE.DE', 'SAF.PA', 'SAN.MC', 'SAP.DE', 'SHEL', 'SIE.DE',
-        'STLA', 'TTE', 'UBSG.SW', 'UL', 'UNA.AS', 'VOD.L', 'VOLV-B.ST', 'VOW3.DE', 'ZURN.SW'
-    ]
-    blue_chip_asia = [
-        '0005.HK', '005930.KS', '0700.HK', '0939.HK', '1299.HK', '2330.TW', '2454.TW', '3988.HK',
-        '6758.T', '7203.T', '7974.T', '8058.T', '8306.T', '9432.T', '9433.T', '9984.T',
-        '9988.HK', 'AXISBANK.NS', 'BABA', 'BHARTIARTL.NS', 'HCLTECH.NS', 'HDFCBANK.NS', 'ICICIBANK.NS',
-        'INFY.NS', 'ITC.NS', 'KOTAKBANK.NS', 'LT.NS', 'PDD', 'RELIANCE.NS', 'SBIN.NS', 'TCS.NS'
-    ]
-    blue_chip_row = [
-        'ABEV', 'ANZ.AX', 'BCE', 'BHP.AX', 'BMO', 'BNS', 'CBA.AX', 'CNQ', 'ENB', 'GGB', 'ITUB',
-        'MFC', 'MQG.AX', 'PBR', 'RY', 'SCCO', 'SHOP', 'SU', 'TD', 'TLS.AX', 'TRP', 'VALE',
-        'WBC.AX', 'WDS.AX', 'WES.AX', 'WPM'
-    ]
-    growth_tech_tickers = [
-        'ABNB', 'AFRM', 'BILL', 'COIN', 'CRWD', 'DASH', 'DDOG', 'ENPH', 'ETSY', 'FSLR',
-        'MDB', 'NET', 'OKTA', 'PANW', 'PATH', 'PINS', 'PLTR', 'RBLX', 'ROKU',
-        'SEDG', 'SNOW', 'SOFI', 'SPOT', 'SQ', 'TTD', 'TWLO', 'U', 'UPST', 'WDAY', 'ZM', 'ZS'
-    ]
-    all_tickers = set(blue_chip_us + blue_chip_eu + blue_chip_asia + blue_chip_row + growth_tech_tickers)
-    return sorted(list(all_tickers))
+    return load_universe(DEFAULT_UNIVERSE)
+
+def default_provider(force_refresh=False):
+    return CachedProvider(RateLimitedProvider(InstrumentedProvider(YFinanceProvider())), force_refresh=force_refresh)
 
 def safe_float(value, default=np.nan):
     try: return float(value) if pd.notna(value) else default
     except (ValueError, TypeError): return default
 
-def calculate_metrics(ticker_symbol):
-    try:
-        ticker = yf.Ticker(ticker_symbol); info = ticker.info
-        if not info or info.get('quoteType') != 'EQUITY' or info.get('marketCap') is None: return None
-        currency = info.get('currency', 'N/A')
-        if currency == 'GBp': currency = 'GBP'
-        metrics = {'Ticker': ticker_symbol, 'Name': info.get('longName', info.get('shortName', ''))[:40],'Sector': info.get('sector', 'N/A'), 'Country': info.get('country', 'N/A'),'MarketCap': safe_float(info.get('marketCap', 0)), 'Currency': currency}
-        metrics['PE'] = safe_float(info.get('trailingPE')); metrics['PB'] = safe_float(info.get('priceToBook'))
-        price = info.get('regularMarketPrice', info.get('currentPrice')); dividend_rate = info.get('dividendRate'); div_yield = 0.0
-        if price and dividend_rate and price > 0:
-            calculated_yield = (safe_float(dividend_rate) / price) * 100
-            if 0 <= calculated_yield < 25.0: div_yield = calculated_yield
-        metrics['DivYield'] = div_yield
-        hist = ticker.history(period='1y', auto_adjust=True)
-        if not hist.empty and len(hist) > 126:
-            metrics['Momentum6M'] = ((hist['Close'].iloc[-1] / hist['Close'].iloc[-126]) - 1) * 100
-            metrics['Volatility'] = hist['Close'].pct_change().std() * np.sqrt(252) * 100
-        financials = ticker.financials; balance_sheet = ticker.balance_sheet
-        if not financials.empty and not balance_sheet.empty:
-            if 'Total Revenue' in financials.index and len(financials.columns) >= 3:
-                rev_now = safe_float(financials.loc['Total Revenue'].iloc[0]); rev_3y_ago = safe_float(financials.loc['Total Revenue'].iloc[2])
-                if rev_now > 0 and rev_3y_ago > 0: metrics['RevGrowth3YCAGR'] = ((rev_now / rev_3y_ago) ** (1 / 3) - 1) * 100
-            if 'Net Income' in financials.index and 'Stockholders Equity' in balance_sheet.index and len(balance_sheet.columns) >= 3:
-                roes = []
-                for i in range(min(3, len(financials.columns))):
-                    ni = safe_float(financials.loc['Net Income'].iloc[i]); equity = safe_float(balance_sheet.loc['Stockholders Equity'].iloc[i])
-                    if pd.notna(ni) and pd.notna(equity) and equity > 0: roes.append((ni / equity) * 100)
-                if roes: metrics['ROE_Avg3Y'] = np.mean(roes)
-            if 'Total Liab' in balance_sheet.index and 'Stockholders Equity' in balance_sheet.index:
-                liabilities = safe_float(balance_sheet.loc['Total Liab'].iloc[0]); equity = safe_float(balance_sheet.loc['Stockholders Equity'].iloc[0])
-                if pd.notna(liabilities) and pd.notna(equity) and equity > 0: metrics['DebtEquity'] = liabilities / equity
-        return metrics
-    except Exception as e: return None
-
-def run_complete_screener(strategy, progress_callback):
-    all_tickers = get_global_top_tickers(); total_tickers = len(all_tickers); results = []; failed_tickers = 0
-    with ThreadPoolExecutor(max_workers=8) as executor:
-        future_to_ticker = {executor.submit(calculate_metrics, ticker): ticker for ticker in all_tickers}
-        for i, future in enumerate(as_completed(future_to_ticker)):
-            progress_callback.emit(int((i + 1) * (100 / total_tickers)))
-            try:
-                result = future.result(timeout=20)
-                if result: results.append(result)
-                else: failed_tickers += 1
-            except Exception as e:
-                failed_tickers += 1; logging.warning(f"Ticker {future_to_ticker[future]} hat einen Fehler verursacht: {e}")
-    if not results:
-        summary = f"<b>Scan fehlgeschlagen.</b><br><br>0 von {total_tickers} Tickers konnten verarbeitet werden."
-        return (pd.DataFrame(), summary)
-    df = pd.DataFrame(results); initial_count = len(df)
-    df['MarketCapUSD'] = df['MarketCap'] * df['Currency'].map(APPROX_RATES).fillna(1.0)
+def calculate_metrics(ticker_symbol, provider=None):
+    # Raises FetchError for tickers without usable data; provider errors propagate so the scheduler can classify them.
+    provider = provider or default_provider(); info = provider.info(ticker_symbol)
+    if not info: raise FetchError('no_data', f"{ticker_symbol}: keine Stammdaten")
+    if info.get('quoteType') != 'EQUITY' or info.get('marketCap') is None: raise FetchError('not_equity', f"{ticker_symbol}: keine Aktie")
+    currency = info.get('currency', 'N/A')
+    if currency == 'GBp': currency = 'GBP'
+    metrics = {'Ticker': ticker_symbol, 'Name': info.get('longName', info.get('shortName', ''))[:40],'Sector': info.get('sector', 'N/A'), 'Country': info.get('country', 'N/A'),'MarketCap': safe_float(info.get('marketCap', 0)), 'Currency': currency}
+    metrics['PE'] = safe_float(info.get('trailingPE')); metrics['PB'] = safe_float(info.get('priceToBook'))
+    price = info.get('regularMarketPrice', info.get('currentPrice')); dividend_rate = info.get('dividendRate'); div_yield = 0.0
+    if price and dividend_rate and price > 0:
+        calculated_yield = (safe_float(dividend_rate) / price) * 100
+        if 0 <= calculated_yield < 25.0: div_yield = calculated_yield
+    metrics['DivYield'] = div_yield
+    # Per-share values implied by Yahoo's own ratios at the scan price; a quote-only refresh re-derives PE, PB, market cap
+    # and yield from them, so at an unchanged price it reproduces the scan exactly.
+    metrics['Price'] = safe_float(price); metrics['DividendRate'] = safe_float(dividend_rate, 0.0)
+    if metrics['Price'] > 0:
+        metrics['EPS'] = metrics['Price'] / metrics['PE'] if metrics['PE'] else np.nan
+        metrics['BookPerShare'] = metrics['Price'] / metrics['PB'] if metrics['PB'] else np.nan
+        metrics['Shares'] = metrics['MarketCap'] / metrics['Price']
+    metrics.update(statement_metrics(statement_rows(provider.financials(ticker_symbol), provider.balance_sheet(ticker_symbol))))
+    return metrics
+
+def statement_rows(financials, balance_sheet):
+    # The statement lines the metrics are built from, as float arrays with the latest fiscal year first.
+    rows = {}
+    if financials.empty or balance_sheet.empty: return rows
+    for frame, labels in ((financials, STATEMENT_LINES['financials']), (balance_sheet, STATEMENT_LINES['balance_sheet'])):
+        # Positional access on the raw array: label lookups through .loc cost more than the arithmetic itself.
+        positions = {label: i for i, label in reversed(list(enumerate(frame.index)))}; values = frame.to_numpy()
+        for label in labels:
+            if label in positions: rows[label] = pd.to_numeric(values[positions[label]], errors='coerce').astype(float)
+    return rows
+
+def statement_metrics(rows, offset=0):
+    # Growth, ROE and leverage as of the fiscal year `offset` (0 = latest), so the backtest can derive the same ratios
+    # for earlier years.
+    metrics = {}; revenue = rows.get('Total Revenue'); income = rows.get('Net Income'); equity = rows.get('Stockholders Equity'); liabilities = rows.get('Total Liab')
+    if revenue is not None and len(revenue) >= offset + 3:
+        rev_now = revenue[offset]; rev_3y_ago = revenue[offset + 2]
+        if rev_now > 0 and rev_3y_ago > 0: metrics['RevGrowth3YCAGR'] = ((rev_now / rev_3y_ago) ** (1 / 3) - 1) * 100
+    if income is not None and equity is not None and len(equity) >= offset + 3:
+        roes = [(income[i] / equity[i]) * 100 for i in range(offset, min(offset + 3, len(income))) if pd.notna(income[i]) and equity[i] > 0]
+        if roes: metrics['ROE_Avg3Y'] = np.mean(roes)
+    if liabilities is not None and equity is not None and len(equity) > offset:
+        if pd.notna(liabilities[offset]) and equity[offset] > 0: metrics['DebtEquity'] = liabilities[offset] / equity[offset]
+    return metrics
+
+def compute_price_factors(closes, lookback=126):
+    # Column-wise over the aligned dates x tickers matrix; each ticker only uses its own trading days (non-NaN rows).
+    # No closes at all (cold cache-only scan, every download chunk empty): no price factors instead of an argmax error.
+    if len(closes) == 0: return pd.DataFrame(columns=['Momentum6M', 'Volatility', 'MomentumBase'], index=closes.columns[:0], dtype=float)
+    # Every intermediate is at most one dates x tickers array and most work happens in place: for large unsharded
+    # universes this matrix is the scan's biggest allocation.
+    values = closes.to_numpy(dtype=float); valid = ~np.isnan(values); cols = np.arange(values.shape[1])
+    remaining = np.cumsum(valid[::-1], axis=0, dtype=np.int32)[::-1]
+    has_history = remaining[0] > lookback
+    last_close = values[np.argmax(valid & (remaining == 1), axis=0), cols]
+    lookback_close = values[np.argmax(valid & (remaining == lookback), axis=0), cols]
+    del remaining
+    # Daily returns against the ticker's previous close (its last trading day, not the previous calendar row).
+    returns = np.empty_like(values); returns[0] = np.nan; returns[1:] = pd.DataFrame(values).ffill().to_numpy()[:-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(values, returns, out=returns); returns -= 1; returns[~valid] = np.nan
+        momentum = (last_close / lookback_close - 1) * 100
+        # Sample standard deviation (ddof=1) over the finite returns, like np.nanstd, without its full-size temporaries.
+        finite = ~np.isnan(returns); n = finite.sum(axis=0); returns[~finite] = 0.0
+        returns -= returns.sum(axis=0) / n; returns[~finite] = 0.0
+        volatility = np.where(has_history, np.sqrt(np.einsum('ij,ij->j', returns, returns) / (n - 1)) * np.sqrt(252) * 100, np.nan)
+    factors = pd.DataFrame({'Momentum6M': momentum, 'Volatility': volatility, 'MomentumBase': lookback_close}, index=closes.columns)
+    return factors[has_history]
+
+# --- Pipeline Stages ---
+def fetch_price_factors(scheduler, tickers, provider, metrics):
+    # The bulk price download runs next to the per-ticker tasks and is bounded by its own deadline.
+    def download():
+        closes = provider.closes(tickers, period='1y')
+        with metrics.stage('price_factors'): return compute_price_factors(closes)
+    future = scheduler.submit(download)
+    deadline = time.monotonic() + PRICE_DEADLINE
+    while not future.done() and time.monotonic() < deadline and not scheduler.cancel_token.cancelled: scheduler.cancel_token.wait(0.1)
+    if scheduler.cancel_token.cancelled: return {}
+    if not future.done(): scheduler.failures['prices_timeout'] += 1; logging.warning("Kursdaten: Zeitüberschreitung beim Sammelabruf"); return {}
+    if future.exception() is not None: scheduler.failures['prices_error'] += 1; logging.warning(f"Kursdaten konnten nicht geladen werden: {future.exception()}"); return {}
+    return future.result().to_dict('index')
+
+def iter_metrics(tickers, provider, scheduler, progress_callback=None, metrics=None):
+    # Yields every FetchOutcome as soon as it is final. Price factors are merged into the records once the bulk
+    # download lands, including records that were already yielded.
+    total_tickers = len(tickers); completed = []; price_factors = None; metrics = metrics or ScanMetrics()
+    price_future = scheduler.submit(fetch_price_factors, scheduler, tickers, provider, metrics)
+    for i, outcome in enumerate(scheduler.run(tickers, metrics.wrap_task(lambda ticker: calculate_metrics(ticker, provider)))):
+        if progress_callback is not None: progress_callback.emit(int((i + 1) * (100 / total_tickers)))
+        if outcome.ok: completed.append(outcome.result)
+        elif outcome.reason not in ('no_data', 'not_equity', 'cancelled'): logging.warning(f"Ticker {outcome.symbol} hat einen Fehler verursacht ({outcome.reason}): {outcome.error}")
+        if price_factors is None and price_future.done():
+            price_factors = price_future.result()
+            for result in completed: result.update(price_factors.get(result['Ticker'], {}))
+        elif price_factors is not None and outcome.ok: outcome.result.update(price_factors.get(outcome.symbol, {}))
+        yield outcome
+    if price_factors is None:
+        price_factors = price_future.result()
+        for result in completed: result.update(price_factors.get(result['Ticker'], {}))
+
+def fetch_metrics(tickers, provider, progress_callback=None, max_workers=MAX_WORKERS, scheduler=None, metrics=None):
+    scheduler = scheduler or FetchScheduler(max_workers=max_workers * 2, initial_workers=max_workers, deadline=TICKER_DEADLINE)
+    outcomes = list(iter_metrics(tickers, provider, scheduler, progress_callback, metrics))
+    if metrics is not None: metrics.record_scheduler(scheduler)
+    results = [outcome.result for outcome in outcomes if outcome.ok]
+    return results, len(outcomes) - len(results)
+
+def compact_frame(df):
+    # Categorical labels and float32 ratios; market caps stay float64 because they exceed float32's 7 significant digits.
+    for col in df.columns:
+        if col in CATEGORICAL_COLUMNS: df[col] = df[col].astype('category')
+        elif col not in FULL_PRECISION_COLUMNS and pd.api.types.is_float_dtype(df[col]): df[col] = df[col].astype(np.float32)
+    return df
+
+def market_cap_usd(df):
+    return df['MarketCap'] * df['Currency'].astype(object).map(APPROX_RATES).fillna(1.0).astype(float)
+
+def deduplicate_metrics(results):
+    df = results.copy() if isinstance(results, pd.DataFrame) else pd.DataFrame(results)
+    df['MarketCapUSD'] = market_cap_usd(df)
     df['NormalizedName'] = df['Name'].str.lower().str.replace(r' inc| corporation| corp| plc| se| sa| ag| ltd| limited| group| holdings| n\.v\.', '', regex=True).str.strip()
     df = df.sort_values('MarketCapUSD', ascending=False).drop_duplicates(subset=['NormalizedName'], keep='first')
-    df = df[df['PE'].isnull() | (df['PE'] > 0)].copy(); final_count = len(df)
-    summary = (f"<b>Scan-Zusammenfassung</b><br><br>"
+    return compact_frame(df[df['PE'].isnull() | (df['PE'] > 0)].copy())
+
+def failure_breakdown(failures):
+    return ", ".join(f"{FAILURE_LABELS_DE[reason]}: {count}" for reason, count in failures.most_common() if count and reason in FAILURE_LABELS_DE)
+
+def scan_summary(total_tickers, initial_count, final_count, failed_tickers, failures, retry_count):
+    return (f"<b>Scan-Zusammenfassung</b><br><br>"
         f"Ticker im Universum: {total_tickers}<br>"
         f"Datenabruf erfolgreich: {initial_count}<br>"
-        f"Datenabruf fehlgeschlagen: {failed_tickers}<br><hr>"
+        f"Datenabruf fehlgeschlagen: {failed_tickers}" + (f" ({failure_breakdown(failures)})" if failed_tickers else "") + "<br>"
+        + (f"Wiederholte Abrufe: {retry_count}<br>" if retry_count else "")
+        + ("Kursdaten (Momentum, Volatilität) nicht verfügbar<br>" if failures['prices_timeout'] or failures['prices_error'] else "") + "<hr>"
         f"<b>Finales Ergebnis nach Qualitätsfilterung: {final_count} Aktien in der Tabelle.</b>")
-    metrics_to_rank = {'ROE_Avg3Y': False, 'PE': True, 'PB': True, 'RevGrowth3YCAGR': False, 'Momentum6M': False, 'DivYield': False, 'Volatility': True, 'DebtEquity': True}
-    for col, asc in metrics_to_rank.items():
-        if col in df.columns:
-            df[col] = df[col].clip(lower=df[col].quantile(0.02), upper=df[col].quantile(0.98))
-            df[f'Rank_{col}'] = df[col].rank(ascending=asc, pct=True) * 100
-    base_scores = {'Quality_Score': {'ROE_Avg3Y': 1.0},'Value_Score': {'PE': 0.5, 'PB': 0.5},'Growth_Score': {'RevGrowth3YCAGR': 1.0},'Momentum_Score': {'Momentum6M': 1.0},'Yield_Score': {'DivYield': 1.0},'Safety_Score': {'Volatility': 0.5, 'DebtEquity': 0.5}}
-    for style, weights in base_scores.items():
-        score_sum = pd.Series(0, index=df.index)
-        for metric, weight in weights.items():
-            rank_col = f'Rank_{metric}'
-            if rank_col in df.columns: score_sum += df[rank_col].fillna(50) * weight
-        df[style] = 100 - score_sum
-    strategy_definitions = {"Balanced": {'Quality_Score': 0.30, 'Value_Score': 0.25, 'Growth_Score': 0.20, 'Momentum_Score': 0.10, 'Yield_Score': 0.10, 'Safety_Score': 0.05},"Deep_Value": {'Value_Score': 0.70, 'Safety_Score': 0.20, 'Yield_Score': 0.10},"High_Growth": {'Growth_Score': 0.60, 'Quality_Score': 0.30, 'Momentum_Score': 0.10},"Quality_Dividend": {'Yield_Score': 0.50, 'Quality_Score': 0.30, 'Safety_Score': 0.20}}
-    for strat_name, weights in strategy_definitions.items():
-        score_sum = pd.Series(0, index=df.index)
-        for score, weight in weights.items():
-            if score in df.columns: score_sum += df[score].fillna(50) * weight
-        df[strat_name] = score_sum
-    for col in df.columns:
-        if '_Score' in col or col in strategy_definitions: df[col] = df[col].round(1)
-    display_columns = ['Name','Ticker','Country','Sector',strategy,'Quality_Score','Value_Score','Growth_Score','Momentum_Score','Yield_Score','Safety_Score','MarketCapUSD','PE','PB','ROE_Avg3Y','RevGrowth3YCAGR','DivYield']
-    final_df = df.sort_values(by=strategy, ascending=False)
-    final_df = final_df[[col for col in display_columns if col in final_df.columns]]
-    return (final_df, summary)
+
+def iter_thread_batches(all_tickers, provider, progress_callback, cancel_token, stats):
+    # Single-process fetch: yields (record or None, failed count) per completed ticker.
+    scheduler = FetchScheduler(max_workers=MAX_WORKERS * 2, initial_workers=MAX_WORKERS, deadline=TICKER_DEADLINE, cancel_token=cancel_token)
+    for outcome in iter_metrics(all_tickers, provider, scheduler, progress_callback, stats['metrics']):
+        yield (outcome.result, 0) if outcome.ok else (None, 1)
+    stats['failures'].update(scheduler.failures); stats['retries'] += scheduler.retry_count; stats['metrics'].record_scheduler(scheduler)
+
+def stream_scan(progress_callback=None, provider=None, tickers=None, cancel_token=None, batch_rows=PARTIAL_BATCH_ROWS, interval=PARTIAL_INTERVAL, processes=None, metrics=None):
+    # Yields ('partial', ranked_df) with a provisional cross-sectional ranking of the tickers fetched so far, at most
+    # every batch_rows new rows or interval seconds, and finally ('done', (ranked_df, summary, report)) where report is
+    # the JSON-serializable ScanMetrics report (pass metrics=ScanMetrics(profile=...) to profile the scan).
+    # Universes of sharding.SHARD_MIN_TICKERS or more are split across worker processes unless processes=1.
+    metrics = metrics or ScanMetrics(); metrics.start()
+    try: yield from _stream_scan(progress_callback, instrument(provider or default_provider(), metrics), tickers, cancel_token or CancelToken(), batch_rows, interval, processes, metrics)
+    finally: metrics.finish()
+
+def _stream_scan(progress_callback, provider, tickers, cancel_token, batch_rows, interval, processes, metrics):
+    all_tickers = tickers or provider.universe() or get_global_top_tickers(); total_tickers = len(all_tickers)
+    processes = sharding.default_processes(total_tickers) if processes is None else processes
+    metrics.info.update(provider=provider.name, processes=processes); stats = {'failures': Counter(), 'retries': 0, 'metrics': metrics}
+    if processes > 1: batches = sharding.iter_shards(all_tickers, provider, processes, progress_callback, cancel_token, stats)
+    else: batches = iter_thread_batches(all_tickers, provider, progress_callback, cancel_token, stats)
+    # Thread batches are single records, shard batches are compact DataFrames.
+    collected = []; fetched_count = 0; failed_tickers = 0; emitted_count = 0; emitted_at = time.monotonic()
+    merged = lambda: pd.concat(collected, ignore_index=True) if processes > 1 else pd.DataFrame(collected)
+    fetch_started = time.perf_counter()
+    for batch, failed in batches:
+        failed_tickers += failed
+        if batch is None or len(batch) == 0: continue
+        collected.append(batch); fetched_count += len(batch) if processes > 1 else 1
+        if fetched_count - emitted_count >= batch_rows or time.monotonic() - emitted_at >= interval:
+            with metrics.stage('partial_ranking'): partial_df = deduplicate_metrics(merged()); partial_df = rank_metrics(partial_df) if not partial_df.empty else partial_df
+            if not partial_df.empty: yield ('partial', partial_df)
+            emitted_count = fetched_count; emitted_at = time.monotonic()
+    # The fetch stage includes the time the consumer spends on partial results (partial_ranking is reported separately).
+    metrics.stages['fetch'] += time.perf_counter() - fetch_started; metrics.failures.update(stats['failures'])
+    metrics.counts.update(universe=total_tickers, fetched=fetched_count, failed=failed_tickers)
+    if cancel_token.cancelled:
+        summary = f"<b>Scan abgebrochen.</b><br><br>{fetched_count} von {total_tickers} Tickers wurden vor dem Abbruch verarbeitet."
+        metrics.info['status'] = 'cancelled'; yield ('done', (pd.DataFrame(), summary, metrics.report())); return
+    if not collected:
+        summary = f"<b>Scan fehlgeschlagen.</b><br><br>0 von {total_tickers} Tickers konnten verarbeitet werden."
+        metrics.info['status'] = 'failed'; yield ('done', (pd.DataFrame(), summary, metrics.report())); return
+    with metrics.stage('dedup'): df = deduplicate_metrics(merged())
+    with metrics.stage('rank'): ranked_df = rank_metrics(df)
+    metrics.counts['final'] = len(df); metrics.info['status'] = 'completed'
+    yield ('done', (ranked_df, scan_summary(total_tickers, fetched_count, len(df), failed_tickers, stats['failures'], stats['retries']), metrics.report()))
+
+def scan_universe(progress_callback, provider=None, tickers=None, cancel_token=None, processes=None, metrics=None):
+    # Data acquisition, dedup and cross-sectional ranking; the result can be re-scored with score_frame at no cost.
+    for event, payload in stream_scan(progress_callback, provider, tickers, cancel_token, batch_rows=float('inf'), interval=float('inf'), processes=processes, metrics=metrics):
+        if event == 'done': return payload
+
+def run_complete_screener(strategy, progress_callback, provider=None, tickers=None, cancel_token=None, processes=None, metrics=None):
+    ranked_df, summary, report = scan_universe(progress_callback, provider, tickers, cancel_token, processes, metrics)
+    if ranked_df.empty: return (ranked_df, summary, report)
+    start = time.perf_counter(); final_df = display_frame(score_frame(ranked_df), strategy)
+    report['stages']['score'] = round(time.perf_counter() - start, 4)
+    return (final_df, summary, report)
+
+# --- Quote-only Refresh ---
+PRICE_METRICS = ['PE', 'PB', 'DivYield', 'Momentum6M']
+
+def apply_quotes(df, quotes):
+    # Re-derives the price-dependent metrics from {ticker: latest price}; statement fundamentals and volatility are kept.
+    # Tickers without a usable quote keep their previous values.
+    df = df.copy(); price = df['Ticker'].astype(object).map(quotes).astype(float).to_numpy()
+    fresh = np.isfinite(price) & (price > 0)
+    column = lambda name: df[name].to_numpy(dtype=float) if name in df.columns else np.full(len(df), np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        div_yield = column('DividendRate') / price * 100
+        derived = {'PE': ('EPS', price / column('EPS')), 'PB': ('BookPerShare', price / column('BookPerShare')), 'MarketCap': ('Shares', price * column('Shares')),
+                   'DivYield': ('DividendRate', np.where((div_yield >= 0) & (div_yield < 25.0), div_yield, 0.0)), 'Momentum6M': ('MomentumBase', (price / column('MomentumBase') - 1) * 100)}
+    for name, (source, values) in derived.items():
+        # Frames without the stored input (scans from older versions) and rows where it is missing keep the scanned value.
+        if name not in df.columns or source not in df.columns: continue
+        df[name] = np.where(fresh & ~np.isnan(values), values, df[name].to_numpy(dtype=float)).astype(df[name].dtype)
+    df['Price'] = np.where(fresh, price, column('Price')); df['MarketCapUSD'] = market_cap_usd(df)
+    return df, int(fresh.sum())
+
+def refresh_quotes(ranked_df, provider=None, metrics=None):
+    # Fast refresh: one batched quote request per PRICE_CHUNK_SIZE tickers instead of four calls per ticker,
+    # then the usual cross-sectional ranking on the updated frame. Returns (ranked_df, summary, report) like a scan.
+    metrics = metrics or ScanMetrics(); metrics.start(); provider = instrument(provider or default_provider(), metrics)
+    tickers = ranked_df['Ticker'].astype(str).tolist(); metrics.info.update(provider=provider.name, mode='quotes_only')
+    with metrics.stage('quotes'): quotes = provider.quotes(tickers)
+    with metrics.stage('apply_quotes'): df, updated = apply_quotes(ranked_df, quotes)
+    # Statement fundamentals and volatility are unchanged, and so are their ranks; only the price-derived metrics are re-ranked.
+    with metrics.stage('rank'): ranked = rank_metrics(compact_frame(df), PRICE_METRICS)
+    metrics.counts.update(universe=len(df), fetched=updated, failed=len(df) - updated, final=len(df)); metrics.failures['no_quote'] += len(df) - updated
+    metrics.info['status'] = 'completed'
+    summary = (f"<b>Kurs-Aktualisierung</b><br><br>"
+        f"Aktien in der Tabelle: {len(df)}<br>"
+        f"Kurse aktualisiert: {updated}<br>"
+        f"Ohne aktuellen Kurs (Werte unverändert): {len(df) - updated}<hr>"
+        f"<b>Bewertungen, Dividendenrendite und Momentum neu berechnet; Fundamentaldaten aus dem letzten Scan.</b>")
+    return ranked, summary, metrics.report()
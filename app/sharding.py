@@ -0,0 +1,79 @@
+# =============================================================================
+# Rectifex - Sharded Scanning
+# Splits large universes across worker processes. Every shard runs its own
+# fetch scheduler (I/O concurrency, share of the rate limit) and returns a
+# compact DataFrame; the parent merges them before the cross-sectional ranking.
+# =============================================================================
+
+import os
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import pandas as pd
+
+import screener_engine
+from data_providers import provider_chain
+from fetch_scheduler import FetchScheduler, CancelToken
+from instrumentation import ScanMetrics, instrument
+
+SHARD_MIN_TICKERS = 2000
+SHARD_SIZE = 500
+MAX_PROCESSES = 8
+
+def default_processes(total_tickers):
+    if total_tickers < SHARD_MIN_TICKERS: return 1
+    return max(1, min(os.cpu_count() or 1, MAX_PROCESSES, math.ceil(total_tickers / SHARD_SIZE)))
+
+def plan_shards(tickers, processes):
+    # Several shards per process keep the pool busy when shards finish unevenly and give finer progress updates.
+    n_shards = max(processes, min(math.ceil(len(tickers) / SHARD_SIZE), processes * 4))
+    return [tickers[i::n_shards] for i in range(n_shards)]
+
+def rate_limiters(provider):
+    return [layer.limiter for layer in provider_chain(provider) if hasattr(layer, 'limiter')]
+
+class QueueProgress:
+    # Stands in for the Qt progress signal inside a worker; one queue item per finished ticker.
+    def __init__(self, queue): self.queue = queue
+    def emit(self, value): self.queue.put(1)
+
+def fetch_shard(tickers, provider, rate_share, cancel_event, progress_queue):
+    # The provider arrives as an unpickled copy, so its limiters are this process's own: scale rate and burst to the
+    # shard's share and hand the same bucket to the scheduler, whose throttling feedback must reach the requests.
+    limiters = rate_limiters(provider)
+    for limiter in limiters:
+        limiter.max_rate *= rate_share; limiter.rate = limiter.max_rate
+        limiter.burst = max(1, math.ceil(limiter.burst * rate_share)); limiter._tokens = float(limiter.burst)
+    scheduler = FetchScheduler(max_workers=screener_engine.MAX_WORKERS * 2, initial_workers=screener_engine.MAX_WORKERS,
+                               deadline=screener_engine.TICKER_DEADLINE, limiter=limiters[0] if limiters else None, cancel_token=CancelToken(cancel_event))
+    metrics = ScanMetrics(); provider = instrument(provider, metrics)
+    results, failed = screener_engine.fetch_metrics(tickers, provider, QueueProgress(progress_queue), scheduler=scheduler, metrics=metrics)
+    frame = screener_engine.compact_frame(pd.DataFrame(results)) if results else pd.DataFrame()
+    return frame, failed, dict(scheduler.failures), scheduler.retry_count, metrics
+
+def iter_shards(tickers, provider, processes, progress_callback=None, cancel_token=None, stats=None):
+    # Yields (shard DataFrame, failed count) as shards complete; failure reasons, retries and the shard metrics
+    # (stats['metrics'], a ScanMetrics) are added to stats.
+    cancel_token = cancel_token or CancelToken(); stats = stats if stats is not None else {'failures': {}, 'retries': 0}
+    context = multiprocessing.get_context('spawn'); total_tickers = len(tickers); completed = 0
+    with context.Manager() as manager, ProcessPoolExecutor(processes, mp_context=context) as pool:
+        cancel_event = manager.Event(); progress_queue = manager.Queue()
+        shards = {pool.submit(fetch_shard, shard, provider, 1 / processes, cancel_event, progress_queue): shard for shard in plan_shards(tickers, processes)}
+        pending = set(shards)
+        while pending:
+            done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            while not progress_queue.empty():
+                progress_queue.get(); completed += 1
+                if progress_callback is not None: progress_callback.emit(int(completed * (100 / total_tickers)))
+            if cancel_token.cancelled and not cancel_event.is_set():
+                cancel_event.set()
+                for future in pending: future.cancel()
+            for future in done:
+                if future.cancelled(): stats['failures']['cancelled'] += len(shards[future]); continue
+                if future.exception() is not None:
+                    stats['failures']['error'] += len(shards[future]); yield (None, len(shards[future])); continue
+                frame, failed, failures, retries, metrics = future.result()
+                stats['failures'].update(failures); stats['retries'] += retries
+                if 'metrics' in stats: stats['metrics'].merge(metrics)
+                yield (frame, failed)
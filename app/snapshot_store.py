@@ -0,0 +1,259 @@
+# =============================================================================
+# Rectifex - Snapshot Store
+# Every completed scan is appended to a columnar store under
+# $XDG_DATA_HOME/rectifex/snapshots, partitioned by month:
+#   2026-10/18-143012_global_top.npz   one scan (appended as it happens)
+#   2026-09/compacted.npz              a closed month, one snapshots x tickers
+#                                      matrix per column
+# Prices, ratios, ranks and scores are stored per snapshot; statement
+# fundamentals and labels go into a shared pool keyed by a row hash, so an
+# unchanged row is stored once no matter how many scans reference it.
+# Queries read one column of the partitions in range into a dates x tickers
+# matrix; blocks stay cached, so repeated queries answer in milliseconds.
+# =============================================================================
+
+import os
+import re
+import fcntl
+import logging
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from scoring_engine import STYLE_COLUMNS
+from screener_engine import FULL_PRECISION_COLUMNS
+
+FUNDAMENTAL_COLUMNS = ['Ticker', 'Name', 'Sector', 'Country', 'Currency', 'RevGrowth3YCAGR', 'ROE_Avg3Y', 'DebtEquity']
+LABEL_COLUMNS = FUNDAMENTAL_COLUMNS[:5]
+POOL_FILE = 'fundamentals.npz'
+COMPACTED_FILE = 'compacted.npz'
+SNAPSHOT_PATTERN = re.compile(r'^(\d{2})-(\d{2})(\d{2})(\d{2})_(.+)\.npz$')
+PARTITION_PATTERN = re.compile(r'^\d{4}-\d{2}$')
+
+def default_snapshot_dir():
+    base = os.environ.get('XDG_DATA_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'share')
+    return os.path.join(base, 'rectifex', 'snapshots')
+
+def universe_key(universe):
+    return re.sub(r'[^A-Za-z0-9_.-]+', '-', universe or 'default')
+
+def row_hashes(df):
+    # Labels hash as plain strings and ratios as float64, so categorical or float32 scan frames hash like the pool rows.
+    # The ratios must be the fetched values (rank_metrics leaves them unclipped): winsorized ones move with the rest of
+    # the universe and would re-key unchanged rows. 0 marks "ticker absent" in the compacted matrices and is never
+    # produced for a real row.
+    dtypes = {col: object if col in LABEL_COLUMNS else np.float64 for col in FUNDAMENTAL_COLUMNS}
+    hashes = pd.util.hash_pandas_object(df[FUNDAMENTAL_COLUMNS].astype(dtypes), index=False).to_numpy()
+    return np.where(hashes == 0, np.uint64(1), hashes)
+
+def missing_value(dtype):
+    return np.uint64(0) if dtype.kind == 'u' else np.nan
+
+class Snapshot:
+    __slots__ = ('taken_at', 'universe', 'path', 'row')
+    def __init__(self, taken_at, universe, path, row=0): self.taken_at = taken_at; self.universe = universe; self.path = path; self.row = row
+    def __repr__(self): return f"Snapshot({self.taken_at}, {self.universe!r})"
+
+class SnapshotStore:
+    def __init__(self, root=None):
+        self.root = root or default_snapshot_dir(); self._cache = {}; self._pool = None
+
+    # --- Writing ---
+    def append(self, scored_df, universe='default', taken_at=None):
+        # scored_df is a ranked and scored frame (score_frame output); returns the snapshot path.
+        taken_at = (taken_at or datetime.now()).replace(microsecond=0)
+        df = scored_df.reset_index(drop=True).reindex(columns=list(dict.fromkeys([*FUNDAMENTAL_COLUMNS, *scored_df.columns])))
+        hashes = row_hashes(df)
+        numeric = [col for col in df.columns if col not in FUNDAMENTAL_COLUMNS and pd.api.types.is_numeric_dtype(df[col])]
+        columns = {col: df[col].to_numpy(dtype=np.float64 if col in FULL_PRECISION_COLUMNS else np.float32) for col in numeric}
+        with self._locked():
+            # File names have one-second resolution; a second scan within the same second moves to the next free one.
+            snapshot_path = lambda t: os.path.join(self.root, t.strftime('%Y-%m'), f"{t.strftime('%d-%H%M%S')}_{universe_key(universe)}.npz")
+            while os.path.exists(snapshot_path(taken_at)): taken_at += timedelta(seconds=1)
+            path = snapshot_path(taken_at); os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._extend_pool(df, hashes)
+            self._save(path, np.savez, Ticker=df['Ticker'].astype(str).to_numpy(dtype=str), fundamentals=hashes, **columns)
+            for month in self._partitions():
+                if month < taken_at.strftime('%Y-%m'): self._compact(month)
+        return path
+
+    def compact(self):
+        # Folds the loose scans of every month into its compacted block (append does this for closed months).
+        with self._locked():
+            for month in self._partitions(): self._compact(month)
+
+    def _locked(self):
+        os.makedirs(self.root, exist_ok=True); lock = open(os.path.join(self.root, '.lock'), 'w'); fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock
+
+    def _extend_pool(self, df, hashes):
+        pool = self._load_pool(reload=True)
+        _, first = np.unique(hashes, return_index=True); new = first[~np.isin(hashes[first], pool['hash'])]
+        if not len(new): return
+        rows = {'hash': hashes[new]}
+        for col in FUNDAMENTAL_COLUMNS:
+            values = df[col].iloc[new]
+            rows[col] = values.astype(object).fillna('').astype(str).to_numpy(dtype=str) if col in LABEL_COLUMNS else values.to_numpy(dtype=np.float64)
+        self._pool = {key: np.concatenate([pool[key], rows[key]]) if len(pool['hash']) else rows[key] for key in rows}
+        self._save(os.path.join(self.root, POOL_FILE), np.savez, **self._pool)
+
+    def _compact(self, month):
+        partition = os.path.join(self.root, month); loose = self._loose_files(month)
+        if not loose: return
+        blocks = [self._block(path) for path in ([os.path.join(partition, COMPACTED_FILE)] if os.path.exists(os.path.join(partition, COMPACTED_FILE)) else []) + loose]
+        tickers = pd.Index(np.concatenate([block['Ticker'] for block in blocks])).unique()
+        keys = list(dict.fromkeys(key for block in blocks for key in block['columns']))
+        merged = {'taken_at': np.concatenate([block['taken_at'] for block in blocks]), 'universe': np.concatenate([block['universe'] for block in blocks]),
+                  'Ticker': tickers.to_numpy(dtype=str)}
+        for key in keys:
+            dtype = next(self._column(block, key).dtype for block in blocks if key in block['columns'])
+            matrix = np.full((len(merged['taken_at']), len(tickers)), missing_value(dtype), dtype=dtype); row = 0
+            for block in blocks:
+                n = len(block['taken_at'])
+                if key in block['columns']: matrix[row:row + n][:, tickers.get_indexer(block['Ticker'])] = self._column(block, key)
+                row += n
+            merged[key] = matrix
+        order = np.argsort(merged['taken_at'], kind='stable')
+        merged = {key: value if key == 'Ticker' else value[order] for key, value in merged.items()}
+        self._save(os.path.join(partition, COMPACTED_FILE), np.savez_compressed, **merged)
+        for path in loose: os.remove(path)
+        for key in [key for key in self._cache if key[0] in loose or key[0].startswith(partition)]: self._cache.pop(key)['data'].close()
+
+    def _save(self, path, writer, **arrays):
+        tmp_path = f"{path}.tmp{os.getpid()}.npz"
+        writer(tmp_path, **arrays); os.replace(tmp_path, path)
+
+    # --- Reading ---
+    def _load_pool(self, reload=False):
+        if self._pool is None or reload:
+            path = os.path.join(self.root, POOL_FILE)
+            if os.path.exists(path):
+                with np.load(path) as data: self._pool = {key: data[key] for key in data.files}
+            else: self._pool = {'hash': np.zeros(0, dtype=np.uint64)}
+        return self._pool
+
+    def _partitions(self):
+        if not os.path.isdir(self.root): return []
+        return sorted(entry for entry in os.listdir(self.root) if PARTITION_PATTERN.match(entry))
+
+    def _loose_files(self, month):
+        partition = os.path.join(self.root, month)
+        return [os.path.join(partition, entry) for entry in sorted(os.listdir(partition)) if SNAPSHOT_PATTERN.match(entry)]
+
+    def _block(self, path):
+        # A loose scan is a one-row block; a compacted month has one row per scan. Columns are read on first use.
+        key = (path, os.stat(path).st_mtime_ns)
+        if key not in self._cache:
+            data = np.load(path); match = SNAPSHOT_PATTERN.match(os.path.basename(path))
+            if match:
+                day, hh, mm, ss, universe = match.groups(); month = os.path.basename(os.path.dirname(path))
+                block = {'taken_at': np.array([f"{month}-{day}T{hh}:{mm}:{ss}"], dtype='datetime64[s]'), 'universe': np.array([universe])}
+            else: block = {'taken_at': data['taken_at'], 'universe': data['universe']}
+            block.update({'path': path, 'data': data, 'Ticker': data['Ticker'], 'columns': [k for k in data.files if k not in ('taken_at', 'universe', 'Ticker')], 'loaded': {}})
+            self._cache[key] = block
+        return self._cache[key]
+
+    def _column(self, block, key):
+        if key not in block['loaded']:
+            values = block['data'][key]; block['loaded'][key] = values[None, :] if values.ndim == 1 else values
+        return block['loaded'][key]
+
+    def _blocks(self, start=None, end=None):
+        # Partition pruning: months outside [start, end] are never opened, loose scans are pruned by file name.
+        start = np.datetime64(pd.Timestamp(start), 's') if start is not None else None
+        end = pd.Timestamp(end) if end is not None else None
+        if end is not None and end == end.normalize(): end = end + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+        end = np.datetime64(end, 's') if end is not None else None
+        blocks = []
+        for month in self._partitions():
+            month_start = np.datetime64(month, 'M')
+            if (start is not None and month_start + 1 <= start.astype('datetime64[M]')) or (end is not None and month_start > end.astype('datetime64[M]')): continue
+            partition = os.path.join(self.root, month)
+            paths = ([os.path.join(partition, COMPACTED_FILE)] if os.path.exists(os.path.join(partition, COMPACTED_FILE)) else []) + self._loose_files(month)
+            blocks.extend(self._block(path) for path in paths)
+        return blocks, start, end
+
+    def _selection(self, block, start, end, universe):
+        times = block['taken_at']; mask = np.ones(len(times), dtype=bool)
+        if start is not None: mask &= times >= start
+        if end is not None: mask &= times <= end
+        if universe is not None: mask &= block['universe'] == universe_key(universe)
+        return mask
+
+    def snapshots(self, start=None, end=None, universe=None):
+        blocks, start, end = self._blocks(start, end); result = []
+        for block in blocks:
+            for row in np.flatnonzero(self._selection(block, start, end, universe)):
+                result.append(Snapshot(pd.Timestamp(block['taken_at'][row]), str(block['universe'][row]), block['path'], int(row)))
+        return sorted(result, key=lambda snapshot: snapshot.taken_at)
+
+    def load(self, snapshot):
+        # Full frame of one snapshot, fundamentals joined back from the pool.
+        block = self._block(snapshot.path); hashes = self._column(block, 'fundamentals')[snapshot.row]; present = hashes != 0
+        df = pd.DataFrame({'Ticker': block['Ticker'][present]})
+        pool = self._load_pool(); positions = pd.Index(pool['hash']).get_indexer(hashes[present])
+        for col in FUNDAMENTAL_COLUMNS[1:]:
+            values = pool[col][positions] if len(pool['hash']) else np.full(len(df), np.nan)
+            df[col] = np.where(positions >= 0, values, '' if values.dtype.kind == 'U' else np.nan)
+        for key in block['columns']:
+            if key != 'fundamentals': df[key] = self._column(block, key)[snapshot.row][present]
+        return df
+
+    def panel(self, column, start=None, end=None, universe=None):
+        # dates x tickers matrix of one column; a ticker missing from a snapshot is NaN there (0 for 'fundamentals').
+        blocks, start, end = self._blocks(start, end); parts = []
+        for block in blocks:
+            if column not in block['columns']: continue
+            mask = self._selection(block, start, end, universe)
+            if mask.any(): parts.append((block['taken_at'][mask], block['Ticker'], self._column(block, column)[mask]))
+        if not parts: return pd.DataFrame(index=pd.DatetimeIndex([], name='taken_at'), dtype=float)
+        tickers = pd.Index(np.concatenate([part[1] for part in parts])).unique(); dtype = np.uint64 if column == 'fundamentals' else np.float64
+        matrix = np.full((sum(len(part[0]) for part in parts), len(tickers)), missing_value(np.dtype(dtype)), dtype=dtype); row = 0
+        for times, block_tickers, values in parts:
+            matrix[row:row + len(times)][:, tickers.get_indexer(block_tickers)] = values; row += len(times)
+        index = pd.DatetimeIndex(np.concatenate([part[0] for part in parts]), name='taken_at')
+        panel = pd.DataFrame(matrix, index=index, columns=tickers)
+        return panel if index.is_monotonic_increasing else panel.sort_index(kind='stable')
+
+    # --- Queries ---
+    def score_history(self, tickers, column='Balanced', start=None, end=None, universe=None):
+        tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+        return self.panel(column, start, end, universe).reindex(columns=tickers)
+
+    def top_movers(self, column='Quality_Score', start=None, end=None, n=20, universe=None, ascending=False):
+        # Change of a column between the first and the last snapshot in range; ascending=True lists the biggest losers.
+        panel = self.panel(column, start, end, universe)
+        if len(panel) < 2: return pd.DataFrame(columns=['Ticker', 'Name', 'Before', 'After', 'Change'])
+        before, after = panel.to_numpy()[0], panel.to_numpy()[-1]; change = after - before; valid = ~np.isnan(change)
+        order = np.argsort(change[valid] if ascending else -change[valid], kind='stable')[:n]
+        movers = pd.DataFrame({'Ticker': panel.columns[valid][order], 'Before': before[valid][order], 'After': after[valid][order], 'Change': change[valid][order]})
+        hashes = self.panel('fundamentals', start, end, universe).iloc[-1].reindex(movers['Ticker']).to_numpy()
+        movers.insert(1, 'Name', self._names(hashes))
+        return movers
+
+    def rank_drift(self, start=None, end=None, universe=None, columns=STYLE_COLUMNS, min_snapshots=3):
+        # Least-squares slope of each factor percentile over time, in points per 30 days; NaN where a ticker has
+        # fewer than min_snapshots observations.
+        drift = {}
+        for column in columns:
+            panel = self.panel(column, start, end, universe)
+            if panel.empty: continue
+            y = panel.to_numpy(); valid = ~np.isnan(y); n = valid.sum(axis=0)
+            t = ((panel.index - panel.index[0]) / pd.Timedelta(days=30)).to_numpy(dtype=float)[:, None]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                t_mean = np.where(valid, t, 0).sum(axis=0) / n; y_mean = np.where(valid, y, 0).sum(axis=0) / n
+                dt = np.where(valid, t - t_mean, 0); slope = (dt * np.where(valid, y - y_mean, 0)).sum(axis=0) / (dt ** 2).sum(axis=0)
+            drift[column] = pd.Series(np.where(n >= min_snapshots, slope, np.nan), index=panel.columns)
+        return pd.DataFrame(drift)
+
+    def _names(self, hashes):
+        pool = self._load_pool()
+        if not len(pool['hash']): return np.full(len(hashes), '')
+        positions = pd.Index(pool['hash']).get_indexer(hashes)
+        return np.where(positions >= 0, pool['Name'][positions], '')
+
+def append_snapshot(scored_df, universe='default', store=None):
+    # Best-effort hook for the GUI and CLI: a full disk or read-only home must never fail the scan itself.
+    try: return (store or SnapshotStore()).append(scored_df, universe)
+    except (OSError, ValueError) as e: logging.warning(f"Snapshot konnte nicht gespeichert werden: {e}"); return None
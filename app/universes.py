@@ -0,0 +1,91 @@
+# =============================================================================
+# Rectifex - Universes
+# Ticker universes loaded from versioned files: the built-in lists shipped in
+# ./universes and user watchlists / index constituents under
+# $XDG_CONFIG_HOME/rectifex/universes. Supported formats:
+#   JSON  - a plain list of symbols, or {"name", "title", "version", "tickers"}
+#           where tickers may also be objects with a "symbol"/"ticker" key
+#   CSV   - a "Ticker" or "Symbol" column, or a header-less file with one
+#           symbol per row; leading "# key: value" lines set title/version
+#   TXT   - one symbol per line, "#" starts a comment
+# =============================================================================
+
+import os
+import csv
+import json
+import logging
+
+BUILTIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'universes')
+DEFAULT_UNIVERSE = 'global_top'
+EXTENSIONS = ('.json', '.csv', '.txt')
+
+def user_universe_dir():
+    base = os.environ.get('XDG_CONFIG_HOME') or os.path.join(os.path.expanduser('~'), '.config')
+    return os.path.join(base, 'rectifex', 'universes')
+
+class Universe:
+    def __init__(self, path, source):
+        self.path = path; self.source = source
+        self.name = os.path.splitext(os.path.basename(path))[0]; self.title = self.name; self.version = ''; self._tickers = None
+
+    @property
+    def label(self):
+        return f"{self.title} (v{self.version})" if self.version else self.title
+
+    def tickers(self):
+        if self._tickers is None: self._tickers = self._load()
+        return self._tickers
+
+    def _load(self):
+        ext = os.path.splitext(self.path)[1].lower()
+        with open(self.path, encoding='utf-8') as f:
+            if ext == '.json': symbols = self._parse_json(json.load(f))
+            elif ext == '.csv': symbols = self._parse_csv(f)
+            else: symbols = [line.split('#', 1)[0].strip() for line in f]
+        # Order-preserving dedup; symbols are upper-cased like Yahoo expects them.
+        return list(dict.fromkeys(symbol.strip().upper() for symbol in symbols if symbol and symbol.strip()))
+
+    def _parse_json(self, data):
+        if isinstance(data, dict):
+            self.title = data.get('title', data.get('name', self.name)); self.version = str(data.get('version', ''))
+            data = data.get('tickers', data.get('constituents', []))
+        return [(entry.get('symbol') or entry.get('ticker') or '') if isinstance(entry, dict) else str(entry) for entry in data]
+
+    def _parse_csv(self, f):
+        lines = []
+        for line in f:
+            if line.startswith('#'):
+                key, _, value = line[1:].partition(':')
+                if key.strip().lower() in ('title', 'version'): setattr(self, key.strip().lower(), value.strip())
+            elif line.strip(): lines.append(line)
+        rows = list(csv.reader(lines))
+        if not rows: return []
+        header = [cell.strip().lower() for cell in rows[0]]
+        for key in ('ticker', 'symbol'):
+            if key in header: return [row[header.index(key)] for row in rows[1:] if len(row) > header.index(key)]
+        # Without a Ticker/Symbol header only a single-column list is unambiguous: every row is a symbol.
+        if any(len(row) > 1 for row in rows): raise ValueError("CSV universe needs a 'Ticker' or 'Symbol' column")
+        return [row[0] for row in rows if row]
+
+def list_universes(errors=None):
+    # User files override built-ins of the same name. Files that cannot be read are skipped with a warning; pass a
+    # dict as errors to get {name: exception} for them.
+    universes = {}; errors = errors if errors is not None else {}
+    for directory, source in ((BUILTIN_DIR, 'builtin'), (user_universe_dir(), 'user')):
+        if not os.path.isdir(directory): continue
+        for entry in sorted(os.listdir(directory)):
+            if os.path.splitext(entry)[1].lower() in EXTENSIONS:
+                universe = Universe(os.path.join(directory, entry), source)
+                try: universe.tickers()
+                except (OSError, ValueError) as e:
+                    logging.warning(f"Universum {universe.path} konnte nicht gelesen werden: {e}"); errors[universe.name] = e; continue
+                universes[universe.name] = universe
+    return universes
+
+def load_universe(name_or_path=DEFAULT_UNIVERSE):
+    if os.path.isfile(name_or_path): return Universe(name_or_path, 'file').tickers()
+    errors = {}; universes = list_universes(errors)
+    # A file of that name that failed to parse reports its own error, not "unknown universe".
+    if name_or_path not in universes and name_or_path in errors: raise errors[name_or_path]
+    if name_or_path not in universes: raise KeyError(f"Unknown universe '{name_or_path}'. Available: {', '.join(sorted(universes))}")
+    return universes[name_or_path].tickers()